@@ -1,12 +1,37 @@
 import os.path
+import re
 import sqlite3
 from pathlib import Path
 import datetime
-from typing import Optional, Union, Any, Dict, List
-
+import threading
+import time
+import operator
+from array import array
+from itertools import compress, repeat
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from queue import Queue
+from concurrent.futures import Future
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from typing import Optional, Union, Any, Dict, List, Set, Tuple, Callable, Hashable, Sequence, Iterable
+
+from kivy.clock import Clock
+from kivy.logger import Logger
 from kivy.utils import platform
 from kivymd.color_definitions import colors
 
+# общий для процесса экземпляр ConnDB, см. shared_db
+_shared_db = None
+
+
+def shared_db() -> "ConnDB":
+    """Возвращает общий для всего процесса экземпляр ConnDB. Создается при первом вызове."""
+    global _shared_db
+    if _shared_db is None:
+        _shared_db = ConnDB()
+    return _shared_db
+
 
 def take_one_data(what_return: str, table: str, condition: Dict[str, Any] = None, order: dict = None) -> str:
     """Возвращает одно (первое) значение из БД.
@@ -21,7 +46,7 @@ def take_one_data(what_return: str, table: str, condition: Dict[str, Any] = None
         Return:
             name - возвращаемое значение."""
 
-    name = ConnDB().take_data(what_return, table, condition, one_value=True, order=order)
+    name = shared_db().take_data(what_return, table, condition, one_value=True, order=order)
     return name[0] if name and name[0] else None
 
 
@@ -38,7 +63,7 @@ def take_many_data(what_return: str, table: str, condition: Dict[str, Any] = Non
             Return:
                 name - список возвращаемых значений."""
 
-    return ConnDB().take_data(what_return, table, condition, one_value=False, order=order)
+    return shared_db().take_data(what_return, table, condition, one_value=False, order=order)
 
 
 def take_name_from_db(table: str) -> list:
@@ -51,31 +76,456 @@ def take_name_from_db(table: str) -> list:
         data (list) - список кортежей полученных имен из БД."""
 
     try:
-        if table == "Referee":
-            data = take_many_data("id", "Referee",
-                                  order={"ASC": ["second_name", "first_name", "third_name"]})
-            name_list = []
-            for id_ in data:
-                name_list.append((Referee(*id_).get_name('second', 'first'),))
-
-            return name_list
-        else:
-            data = take_many_data("name", table, order={"ASC": ["name"]})
-            return data
+        return [(name,) for _, name in take_display_names(table)]
 
-    except AttributeError:
+    except (AttributeError, ValueError):
         raise AttributeError(f"ConnDB has no table '{table}'")
 
 
+# показываемые имена строк таблиц (ключ - название таблицы в нижнем регистре): столбцы, из которых
+# собирается имя, и столбцы сортировки. Имена строк остальных таблиц - столбец name
+display_name_columns = {"referee": (("second_name", "first_name"), ["second_name", "first_name", "third_name"]),
+                        }
+
+
+def take_display_names(table: str, condition: Dict[str, Any] = None) -> List[Tuple[int, str]]:
+    """Возвращает id и показываемые имена строк таблицы table, подходящих по условиям, одним запросом.
+    Имя собирается из столбцов display_name_columns через пробел (как Referee.get_name), без создания объектов.
+
+        Return:
+            names - список пар (id, имя), упорядоченный по display_name_columns."""
+
+    columns, order = display_name_columns.get(table.lower(), (("name",), ["name"]))
+    rows = take_many_data(", ".join(("id",) + columns), table, condition, order={"ASC": order})
+    return [(id_, " ".join(filter(None, names))) for id_, *names in rows]
+
+
+def _display_name_sql(table: str, prefix: str = "") -> str:
+    """Выражение SQL для показываемого имени строки таблицы (как take_display_names)."""
+    columns = display_name_columns.get(table, (("name",),))[0]
+    return "TRIM(" + " || ' ' || ".join(f"IFNULL({prefix}{column}, '')" for column in columns) + ")"
+
+
+# латинские буквы и сочетания букв, которыми набирают русские имена (для поиска имен, набранных латиницей)
+_latin_to_cyrillic = {"shch": "щ", "sch": "щ", "zh": "ж", "kh": "х", "ts": "ц", "ch": "ч", "sh": "ш",
+                      "yu": "ю", "ya": "я", "yo": "ё", "ye": "е",
+                      "a": "а", "b": "б", "c": "к", "d": "д", "e": "е", "f": "ф", "g": "г", "h": "х", "i": "и",
+                      "j": "й", "k": "к", "l": "л", "m": "м", "n": "н", "o": "о", "p": "п", "q": "к", "r": "р",
+                      "s": "с", "t": "т", "u": "у", "v": "в", "w": "в", "x": "кс", "y": "й", "z": "з",
+                      }
+_latin_pattern = re.compile("|".join(sorted(_latin_to_cyrillic, key=len, reverse=True)))
+
+
+def _trigram_query(text: str) -> str:
+    """Запрос FTS5 MATCH, находящий строки хотя бы с одной триграммой text (и его записи кириллицей,
+    если text набран латиницей). Пустая строка, если в text меньше трех символов."""
+    text = text.strip().casefold()
+    variants = {text, _latin_pattern.sub(lambda match: _latin_to_cyrillic[match.group()], text)}
+    grams = {variant[start:start + 3] for variant in variants for start in range(len(variant) - 2)}
+    return " OR ".join('"' + gram.replace('"', '""') + '"' for gram in sorted(grams))
+
+
+def _casefold(text):
+    """Функция casefold для запросов SQL (см. ConnDB.connection)."""
+    return text.casefold() if isinstance(text, str) else text
+
+
+class IdentityMap:
+    """Кэш созданных объектов одной таблицы (ключ - id и дополнительные параметры объекта).
+    Размер ограничен, при переполнении вытесняются давно не использованные объекты."""
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._objects = OrderedDict()
+        # кэш используется и из потока DBWorker
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._objects
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Возвращает объект по ключу. Если его нет в кэше, создает с помощью factory и запоминает."""
+        with self._lock:
+            if key in self._objects:
+                self._objects.move_to_end(key)
+                return self._objects[key]
+
+        # factory может обращаться к БД, поэтому вызывается без блокировки кэша
+        obj = factory()
+        with self._lock:
+            obj = self._objects.setdefault(key, obj)
+            if len(self._objects) > self.max_size:
+                self._objects.popitem(last=False)
+        return obj
+
+    def clear(self) -> None:
+        with self._lock:
+            self._objects.clear()
+
+
+# кэши объектов по таблицам (ключ - название таблицы в нижнем регистре)
+identity_maps: Dict[str, IdentityMap] = {table: IdentityMap()
+                                         for table in ("referee", "league", "stadium", "team", "category", "city")}
+
+# таблицы, объекты которых хранят ссылки на объекты других таблиц (Referee.category, Stadium.city)
+_identity_map_dependents = {"category": ("referee",),
+                            "city": ("stadium",),
+                            }
+
+
+def invalidate_identity_map(table: str) -> None:
+    """Очищает кэш объектов таблицы table и таблиц, объекты которых ссылаются на нее."""
+    table = table.lower()
+    for name in (table, *_identity_map_dependents.get(table, ())):
+        if name in identity_maps:
+            identity_maps[name].clear()
+
+
+class NameIndex:
+    """Индекс автодополнения имен одной таблицы. Имена в casefold хранятся в отсортированном массиве
+    для поиска по началу имени (bisect) и в индексе n-грамм (подстрок длиной до ngram символов)
+    для поиска по любой части имени. Поиск не просматривает все имена таблицы."""
+
+    ngram = 3
+
+    def __init__(self, names: Iterable[Tuple[int, str]]):
+        """Parameters:
+            names - пары (id, показываемое имя) строк таблицы."""
+
+        # индекс обновляется из потока DBWorker, а поиск выполняется в основном потоке
+        self._lock = threading.Lock()
+        self._names: Dict[int, str] = {}
+        self._folded: Dict[int, str] = {}
+        self._ngrams: Dict[str, Set[int]] = defaultdict(set)
+        for id_, name in names:
+            self._index(id_, name)
+        self._sorted = sorted((folded, id_) for id_, folded in self._folded.items())
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, id_: int, name: str) -> None:
+        """Добавляет в индекс имя новой строки таблицы."""
+        with self._lock:
+            self._remove(id_)
+            self._index(id_, name)
+            insort(self._sorted, (self._folded[id_], id_))
+
+    def remove(self, id_: int) -> None:
+        """Удаляет из индекса имя строки таблицы."""
+        with self._lock:
+            self._remove(id_)
+
+    def find_id(self, name: str) -> Optional[int]:
+        """Возвращает id строки с показываемым именем name (наименьший, если таких несколько).
+        Если точного совпадения нет, подходит имя, отличающееся только регистром. None - имени нет."""
+        folded = name.casefold()
+        with self._lock:
+            found = None
+            for inx in range(bisect_left(self._sorted, (folded,)), len(self._sorted)):
+                folded_name, id_ = self._sorted[inx]
+                if folded_name != folded:
+                    break
+                if self._names[id_] == name:
+                    return id_
+                if found is None:
+                    found = id_
+            return found
+
+    def names(self) -> List[str]:
+        """Все имена таблицы по алфавиту."""
+        with self._lock:
+            return [self._names[id_] for _, id_ in self._sorted]
+
+    def search(self, text: str, limit: int = 10) -> List[str]:
+        """Возвращает до limit имен, содержащих text (без учета регистра): сначала имена, начинающиеся с text,
+        затем остальные, каждая группа - по алфавиту. Пустой text - первые limit имен по алфавиту."""
+
+        key = text.casefold()
+        with self._lock:
+            found = []
+            # имена, начинающиеся с key, идут в отсортированном массиве подряд
+            for inx in range(bisect_left(self._sorted, (key,)), len(self._sorted)):
+                folded, id_ = self._sorted[inx]
+                if len(found) == limit or not folded.startswith(key):
+                    break
+                found.append(id_)
+
+            if key and len(found) < limit:
+                prefix_ids = set(found)
+                other = ((self._folded[id_], id_) for id_ in self._substring_ids(key)
+                         if id_ not in prefix_ids and key in self._folded[id_])
+                found += [id_ for _, id_ in nsmallest(limit - len(found), other)]
+
+            return [self._names[id_] for id_ in found]
+
+    def _index(self, id_: int, name: str) -> None:
+        name = name or ""
+        folded = name.casefold()
+        self._names[id_] = name
+        self._folded[id_] = folded
+        for gram in self._grams(folded):
+            self._ngrams[gram].add(id_)
+
+    def _remove(self, id_: int) -> None:
+        folded = self._folded.pop(id_, None)
+        if folded is None:
+            return
+        del self._names[id_]
+        del self._sorted[bisect_left(self._sorted, (folded, id_))]
+        for gram in self._grams(folded):
+            ids = self._ngrams[gram]
+            ids.discard(id_)
+            if not ids:
+                del self._ngrams[gram]
+
+    def _grams(self, folded: str) -> Set[str]:
+        return {folded[start:start + size] for size in range(1, self.ngram + 1)
+                for start in range(len(folded) - size + 1)}
+
+    def _substring_ids(self, key: str) -> Set[int]:
+        """id строк, в именах которых есть все n-граммы key (кандидаты, требующие проверки)."""
+        if len(key) <= self.ngram:
+            return self._ngrams.get(key, set())
+        grams = sorted((self._ngrams.get(key[start:start + self.ngram], set())
+                        for start in range(len(key) - self.ngram + 1)), key=len)
+        return grams[0].intersection(*grams[1:])
+
+
+# общий для процесса кэш имен по таблицам (ключ - название таблицы в нижнем регистре), см. name_index.
+# Загружается один раз и обновляется после каждой записи в таблицу, поэтому поля ввода не обращаются к БД
+name_indexes: Dict[str, NameIndex] = {}
+_name_indexes_lock = threading.Lock()
+
+
+def name_index(table: str) -> NameIndex:
+    """Возвращает общий для всех полей ввода кэш и индекс автодополнения имен таблицы table.
+    При первом вызове имена загружаются из БД, затем кэш поддерживается после каждой записи в таблицу."""
+    index = name_indexes.get(table.lower())
+    if index is None:
+        index = NameIndex(take_display_names(table))
+        with _name_indexes_lock:
+            index = name_indexes.setdefault(table.lower(), index)
+    return index
+
+
+def _update_name_indexes(table: str, action: str, data: dict, conditions: dict) -> None:
+    """Применяет запись в БД к кэшу имен таблицы (см. ConnDB.add_write_listener).
+    Строка, измененная по id, обновляется в кэше одна, без загрузки остальных имен."""
+    index = name_indexes.get(table.lower())
+    if index is None:
+        return
+
+    if conditions.keys() == {"id"}:
+        id_ = conditions["id"]
+        names = take_display_names(table, {"id": id_}) if action != "delete" else []
+        if names:
+            index.add(*names[0])
+        else:
+            index.remove(id_)
+    else:
+        # неизвестно, какие строки изменились: имена таблицы загружаются заново
+        index = NameIndex(take_display_names(table))
+        with _name_indexes_lock:
+            name_indexes[table.lower()] = index
+
+
+class QueryStats:
+    """Статистика запросов к БД: количество вызовов, время выполнения и число строк по каждому шаблону SQL.
+    Запросы дольше slow_query_time записываются в лог."""
+
+    def __init__(self, slow_query_time: float = 0.05, samples: int = 1000):
+        """Parameters:
+            slow_query_time(float) - время выполнения запроса в секундах, начиная с которого запрос пишется в лог.
+            samples(int) - сколько последних измерений каждого шаблона хранить для расчета процентилей."""
+
+        self.slow_query_time = slow_query_time
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._templates = {}
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = defaultdict(int)
+            self.total_time = defaultdict(float)
+            self.rows = defaultdict(int)
+            self.times = defaultdict(lambda: deque(maxlen=self.samples))
+            # количество запросов в участках кода, измеренных measure
+            self.sections = defaultdict(list)
+
+    def record(self, sql: str, seconds: float, rows: int, values=None) -> None:
+        """Записывает выполнение запроса sql, занявшее seconds секунд и вернувшее (изменившее) rows строк."""
+        # шаблон запроса без переносов строк и лишних пробелов
+        template = self._templates.get(sql)
+        if template is None:
+            template = self._templates[sql] = " ".join(sql.split())
+        sql = template
+
+        with self._lock:
+            self.calls[sql] += 1
+            self.total_time[sql] += seconds
+            self.rows[sql] += rows
+            self.times[sql].append(seconds)
+
+        for section in getattr(self._local, "sections", ()):
+            section[1] += 1
+
+        if seconds >= self.slow_query_time:
+            Logger.warning(f"Database: slow query {seconds * 1000:.1f} ms, {rows} rows: {sql} {values or ''}")
+
+    @contextmanager
+    def measure(self, name: str):
+        """Считает запросы, выполненные в текущем потоке внутри блока with, и записывает их количество
+        в sections[name]. Например, так видно, сколько запросов делает одно обновление таблицы игр."""
+
+        section = [name, 0]
+        sections = self._local.__dict__.setdefault("sections", [])
+        sections.append(section)
+        try:
+            yield
+        finally:
+            sections.remove(section)
+            with self._lock:
+                self.sections[name].append(section[1])
+            Logger.debug(f"Database: {name} - {section[1]} queries")
+
+    def percentile(self, sql: str, percent: float) -> float:
+        """Время выполнения шаблона sql (в секундах), которое не превышают percent процентов запросов."""
+        times = sorted(self.times[sql])
+        if not times:
+            return 0.0
+        return times[min(len(times) - 1, int(len(times) * percent / 100))]
+
+    def report(self) -> str:
+        """Возвращает отчет по всем шаблонам запросов (сначала самые затратные) и измеренным участкам кода."""
+        with self._lock:
+            lines = ["calls  total ms    p50 ms    p95 ms    rows  sql"]
+            for sql in sorted(self.calls, key=self.total_time.get, reverse=True):
+                lines.append(f"{self.calls[sql]:>5} {self.total_time[sql] * 1000:>9.1f} "
+                             f"{self.percentile(sql, 50) * 1000:>9.2f} {self.percentile(sql, 95) * 1000:>9.2f} "
+                             f"{self.rows[sql]:>7}  {sql}")
+
+            for name, counts in self.sections.items():
+                lines.append(f"{name}: {len(counts)} runs, last {counts[-1]} queries, "
+                             f"max {max(counts)} queries")
+        return "\n".join(lines)
+
+
+class DBWorker:
+    """Отдельный поток, по очереди выполняющий запросы к БД, чтобы не блокировать интерфейс."""
+
+    def __init__(self):
+        self._queue = Queue()
+        self._thread = threading.Thread(target=self._run, name="DBWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable, *args, callback: Optional[Callable[[Any], None]] = None,
+               error_callback: Optional[Callable[[BaseException], None]] = None, **kwargs) -> Future:
+        """Ставит вызов func(*args, **kwargs) в очередь потока.
+
+            Parameters:
+                callback - функция, которой результат func передается в главном потоке Kivy
+                           (через Clock.schedule_once). Если func завершилась исключением, callback не вызывается.
+                error_callback - функция, которой вместо этого передается исключение из func (в главном потоке).
+                                 Без error_callback исключение записывается в лог.
+
+            Return:
+                future - Future с результатом func."""
+
+        future = Future()
+        if callback or error_callback:
+            # отмененный до выполнения вызов (future.cancel()) не выполняется, и callback не вызывается
+            future.add_done_callback(
+                lambda f: f.cancelled() or Clock.schedule_once(lambda _: self._deliver(f, callback, error_callback)))
+        self._queue.put((future, func, args, kwargs, error_callback is not None))
+        return future
+
+    @staticmethod
+    def _deliver(future: Future, callback: Optional[Callable[[Any], None]],
+                 error_callback: Optional[Callable[[BaseException], None]]) -> None:
+        if future.exception() is not None:
+            # без error_callback ошибка уже записана в лог потоком DBWorker
+            if error_callback:
+                error_callback(future.exception())
+        elif callback:
+            callback(future.result())
+
+    def stop(self) -> None:
+        """Выполняет уже поставленные в очередь запросы и останавливает поток."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+
+            future, func, args, kwargs, has_error_callback = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as error:
+                if not has_error_callback:
+                    # ошибку никто не обработает - без лога она потерялась бы
+                    Logger.exception(f"Database: {getattr(func, '__name__', func)} failed: {error}")
+                future.set_exception(error)
+
+
+class _BatchState:
+    """Состояние транзакции batch: вложенность и записи, о которых write_listeners узнают после commit."""
+    __slots__ = ("depth", "writes")
+
+    def __init__(self):
+        self.depth = 0
+        self.writes = []
+
+
 class ConnDB:
+    # открытые соединения с БД, общие для всех экземпляров класса (ключ - путь к файлу БД)
+    _connections: Dict[str, sqlite3.Connection] = {}
+    # файлы БД, для которых в этом процессе уже создана схема
+    _schema_ready: Set[str] = set()
+    # таблицы и столбцы БД (см. _read_schema), по ним проверяются названия в запросах
+    _schemas: Dict[str, Dict[str, Tuple[str, Set[str]]]] = {}
+    # блокировки соединений: соединение используется и главным потоком, и потоком DBWorker
+    _locks: Dict[str, threading.RLock] = {}
+    # открытые транзакции batch по файлам БД: общие для всех экземпляров, как и соединение, поэтому запись
+    # через другой экземпляр ConnDB внутри batch входит в ту же транзакцию
+    _batches: Dict[str, "_BatchState"] = {}
+    # статистика всех запросов, см. QueryStats
+    stats = QueryStats()
+    # поток для запросов из интерфейса, см. run_async
+    _worker: Optional[DBWorker] = None
+    # функции, вызываемые после каждой записи в БД: listener(table, action, data, conditions)
+    # (вызываются в том потоке, где была запись)
+    write_listeners: List[Callable[[str, str, dict, dict], None]] = []
+
     def __init__(self):
+        # шаблоны SQL, собранные _cached_sql (одинаковый текст запроса попадает в кэш запросов sqlite3)
+        self._sql_cache: Dict[tuple, str] = {}
+        self._games_store: Optional[GamesStore] = None
+
         if platform == "android":
             self.path_db = os.path.join(os.environ["ANDROID_STORAGE"], "emulated", "0", "referee.db")
         else:
             self.path_db = os.path.join(os.path.expanduser("~"), "PycharmProjects", "Referee_App", "referee.db")
 
+        if self.path_db not in self._schema_ready:
+            self._create_schema()
+            self._schema_ready.add(self.path_db)
+
+    def _create_schema(self) -> None:
+        """Создает файл БД и недостающие таблицы. Выполняется один раз за процесс для каждого файла БД."""
+
         with open(self.path_db, "a"):
-            with sqlite3.connect(self.path_db) as conn:
+            with self.connection as conn:
                 cursor = conn.cursor()
                 cursor.execute("""CREATE TABLE IF NOT EXISTS Games (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -146,110 +596,782 @@ class ConnDB:
                 FOREIGN KEY (city_id) REFERENCES City(id)
                 )""")
 
+                self._migrate(cursor)
                 conn.commit()
 
+                self._schemas[self.path_db] = self._read_schema(cursor)
+
+    @staticmethod
+    def _read_schema(cursor: sqlite3.Cursor) -> Dict[str, Tuple[str, Set[str]]]:
+        """Читает из БД названия таблиц и их столбцов.
+
+            Return:
+                schema - словарь, где ключ - название таблицы в нижнем регистре, а значение -
+                         название таблицы, как в БД, и множество названий ее столбцов в нижнем регистре."""
+
+        schema = {}
+        tables = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            columns = {row[1].lower() for row in cursor.execute(f'PRAGMA table_info("{table}")')}
+            schema[table.lower()] = (table, columns)
+        return schema
+
+    # миграции схемы по порядку: миграция с индексом i переводит БД из версии i в i + 1
+    # (текущая версия хранится в PRAGMA user_version)
+    migrations = ("_migration_games_start_at",
+                  "_migration_games_summary",
+                  "_migration_names_fts",
+                  )
+
+    def _migrate(self, cursor: sqlite3.Cursor) -> None:
+        """Применяет к БД миграции, которые еще не были выполнены.
+        NamesFTS, не созданный при миграции из-за старой версии SQLite, создается при следующем запуске,
+        как только SQLite его поддерживает (версия БД при этом уже записана)."""
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for inx in range(version, len(self.migrations)):
+            getattr(self, self.migrations[inx])(cursor)
+            cursor.execute(f"PRAGMA user_version = {inx + 1}")
+
+        names_fts_migrated = version > self.migrations.index("_migration_names_fts")
+        if names_fts_migrated and not cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'NamesFTS'").fetchone():
+            self._migration_names_fts(cursor)
+
+    @staticmethod
+    def _start_at_sql(prefix: str = "") -> str:
+        """Выражение для столбца start_at: дата и время начала игры в виде числа YYYYMMDDHHMM."""
+        return f"{prefix}year * 100000000 + {prefix}month * 1000000 + {prefix}day * 10000 + {prefix}time"
+
+    def _migration_games_start_at(self, cursor: sqlite3.Cursor) -> None:
+        """Добавляет в Games сортируемый столбец start_at, поддерживаемый триггерами,
+        и индексы по дате, внешним ключам и статусу игры."""
+
+        columns = [column[1] for column in cursor.execute("PRAGMA table_info(Games)")]
+        if "start_at" not in columns:
+            cursor.execute("ALTER TABLE Games ADD COLUMN start_at INTEGER")
+        cursor.execute(f"UPDATE Games SET start_at = {self._start_at_sql()}")
+
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS games_start_at_insert AFTER INSERT ON Games
+        BEGIN
+            UPDATE Games SET start_at = {self._start_at_sql("NEW.")} WHERE id = NEW.id;
+        END""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS games_start_at_update
+        AFTER UPDATE OF year, month, day, time ON Games
+        BEGIN
+            UPDATE Games SET start_at = {self._start_at_sql("NEW.")} WHERE id = NEW.id;
+        END""")
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS games_start_at ON Games (start_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS games_status ON Games (game_passed, pay_done)")
+        for column in ("stadium_id", "league_id", "team_home", "team_guest") + self.referee_columns:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS games_{column} ON Games ({column})")
+
+    @staticmethod
+    def _status_sql(prefix: str = "") -> str:
+        """Выражение для статуса игры (ключ Game.status_icn), как в games_status_conditions."""
+        return f"""CASE WHEN {prefix}game_passed = 1
+                        THEN CASE WHEN {prefix}pay_done = 1 THEN 'pay_done' ELSE 'passed' END
+                        ELSE 'not_passed' END"""
+
+    def _migration_games_summary(self, cursor: sqlite3.Cursor) -> None:
+        """Добавляет таблицу GamesSummary: количество игр и сумма оплаты по каждому статусу.
+        Счетчики изменяются триггерами при каждой вставке, изменении и удалении игры (см. games_summary)."""
+
+        cursor.execute("""CREATE TABLE IF NOT EXISTS GamesSummary (
+            status TEXT PRIMARY KEY,
+            games INTEGER NOT NULL DEFAULT 0,
+            payment INTEGER NOT NULL DEFAULT 0)""")
+        cursor.execute("DELETE FROM GamesSummary")
+        cursor.executemany("INSERT INTO GamesSummary (status) VALUES (?)", [[status] for status in Game.status_icn])
+        cursor.execute(f"""UPDATE GamesSummary
+            SET games = (SELECT COUNT(*) FROM Games WHERE {self._status_sql()} = GamesSummary.status),
+                payment = (SELECT IFNULL(SUM(payment), 0) FROM Games WHERE {self._status_sql()} = GamesSummary.status)""")
+
+        add = f"""UPDATE GamesSummary SET games = games + 1, payment = payment + IFNULL(NEW.payment, 0)
+                  WHERE status = {self._status_sql("NEW.")};"""
+        remove = f"""UPDATE GamesSummary SET games = games - 1, payment = payment - IFNULL(OLD.payment, 0)
+                     WHERE status = {self._status_sql("OLD.")};"""
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS games_summary_insert AFTER INSERT ON Games
+        BEGIN
+            {add}
+        END""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS games_summary_delete AFTER DELETE ON Games
+        BEGIN
+            {remove}
+        END""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS games_summary_update
+        AFTER UPDATE OF game_passed, pay_done, payment ON Games
+        BEGIN
+            {remove}
+            {add}
+        END""")
+
+    # таблицы, показываемые имена которых ищутся в NamesFTS (см. search_names).
+    # rowid строки NamesFTS - id * 8 + индекс таблицы в names_fts_tables
+    names_fts_tables = ("referee", "team", "stadium", "league", "city", "category")
+
+    def _migration_names_fts(self, cursor: sqlite3.Cursor) -> None:
+        """Добавляет полнотекстовый индекс NamesFTS (FTS5 с токенайзером trigram) показываемых имен
+        судей, команд, стадионов, лиг, городов и категорий для нечеткого поиска. Индекс поддерживается триггерами.
+        Если SQLite собран без FTS5 или не поддерживает trigram (до версии 3.34), индекс не создается."""
+
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS NamesFTS USING fts5(name, tokenize = 'trigram')")
+        except sqlite3.OperationalError as error:
+            Logger.warning(f"Database: fuzzy name search is unavailable: {error}")
+            return
+
+        cursor.execute("DELETE FROM NamesFTS")
+        for code, table in enumerate(self.names_fts_tables):
+            name_columns = ", ".join(display_name_columns.get(table, (("name",),))[0])
+            add = f"""INSERT INTO NamesFTS (rowid, name)
+                      VALUES (NEW.id * 8 + {code}, {_display_name_sql(table, "NEW.")});"""
+            remove = f"DELETE FROM NamesFTS WHERE rowid = OLD.id * 8 + {code};"
+
+            cursor.execute(f"INSERT INTO NamesFTS (rowid, name) SELECT id * 8 + {code}, "
+                           f"{_display_name_sql(table)} FROM {table}")
+            cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_names_fts_insert AFTER INSERT ON {table}
+            BEGIN
+                {add}
+            END""")
+            cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_names_fts_delete AFTER DELETE ON {table}
+            BEGIN
+                {remove}
+            END""")
+            cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_names_fts_update
+            AFTER UPDATE OF {name_columns} ON {table}
+            BEGIN
+                {remove}
+                {add}
+            END""")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Долгоживущее соединение с БД. Открывается при первом обращении и переиспользуется
+        всеми запросами до вызова close."""
+
+        conn = self._connections.get(self.path_db)
+        if conn is None:
+            conn = sqlite3.connect(self.path_db, check_same_thread=False, cached_statements=256)
+            # lower/LIKE в SQLite не учитывают регистр только для латиницы
+            conn.create_function("casefold", 1, _casefold, deterministic=True)
+            self._connections[self.path_db] = conn
+        return conn
+
+    @property
+    def _batch(self) -> "_BatchState":
+        """Транзакция batch соединения с файлом БД этого экземпляра."""
+        return self._batches.setdefault(self.path_db, _BatchState())
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Блокировка соединения. Запросы и транзакции batch выполняются под ней."""
+        return self._locks.setdefault(self.path_db, threading.RLock())
+
+    def run_async(self, func: Callable, *args, callback: Optional[Callable[[Any], None]] = None,
+                  error_callback: Optional[Callable[[BaseException], None]] = None, **kwargs) -> Future:
+        """Выполняет func(*args, **kwargs) в потоке DBWorker, не блокируя интерфейс.
+
+            Parameters:
+                func - функция, обращающаяся к БД (например, self.update или take_name_from_db).
+                callback - функция, получающая результат func в главном потоке Kivy.
+                error_callback - функция, получающая исключение из func в главном потоке Kivy
+                                 (без нее исключение записывается в лог, а callback не вызывается).
+
+            Return:
+                future - Future с результатом func."""
+
+        if ConnDB._worker is None:
+            ConnDB._worker = DBWorker()
+        return ConnDB._worker.submit(func, *args, callback=callback, error_callback=error_callback, **kwargs)
+
+    def close(self) -> None:
+        """Закрывает соединение с БД. Следующий запрос откроет новое соединение."""
+        conn = self._connections.pop(self.path_db, None)
+        if conn is not None:
+            conn.close()
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Дожидается запросов DBWorker и закрывает все открытые соединения
+        (вызывается при остановке приложения)."""
+        if cls._worker is not None:
+            cls._worker.stop()
+            cls._worker = None
+
+        for path in list(cls._connections):
+            cls._connections.pop(path).close()
+
+    # столбцы таблицы Games в порядке, в котором их возвращают games и game
+    games_columns = ("id",
+                     "league_id",
+                     "stadium_id",
+                     "team_home",
+                     "team_guest",
+                     "referee_chief",
+                     "referee_first",
+                     "referee_second",
+                     "referee_reserve",
+                     "game_passed",
+                     "payment",
+                     "pay_done",
+                     "year",
+                     "month",
+                     "day",
+                     "time",
+                     "team_home_year",
+                     "team_guest_year",
+                     )
+
+    referee_columns = ("referee_chief", "referee_first", "referee_second", "referee_reserve")
+
+    # порядок игр в таблице: сначала последние (использует индекс games_start_at)
+    games_order = "g.start_at DESC, g.id DESC"
+
     @property
     def games(self) -> List[dict]:
         """Возвращает все данные по всем играм в виде списка словарей."""
 
-        column_names = ("id",
-                        "league_id",
-                        "stadium_id",
-                        "team_home",
-                        "team_guest",
-                        "referee_chief",
-                        "referee_first",
-                        "referee_second",
-                        "referee_reserve",
-                        "game_passed",
-                        "payment",
-                        "pay_done",
-                        "year",
-                        "month",
-                        "day",
-                        "time",
-                        "team_home_year",
-                        "team_guest_year",
-                        )
-
-        sql = f'''SELECT * FROM Games ORDER BY year DESC, month DESC, day DESC, time ASC'''
+        columns = ", ".join(f"g.{c}" for c in self.games_columns)
+        sql = f'''SELECT {columns} FROM Games g ORDER BY {self.games_order}'''
 
         games_dict_of_kwargs = []
         return_request = self._select_request(sql)
         for r in return_request:
-            games_dict_of_kwargs.append(dict(zip(column_names, r)))
+            games_dict_of_kwargs.append(dict(zip(self.games_columns, r)))
 
         return games_dict_of_kwargs
 
+    def _games_page_tail(self, after: Optional[Tuple[int, int]]) -> Tuple[str, list]:
+        """Окончание запроса страницы игр после игры с ключом after (без значения LIMIT)."""
+        if after:
+            start_at, id_ = after
+            where = "WHERE g.start_at <= ? AND (g.start_at < ? OR g.id < ?)"
+            values = [start_at, start_at, id_]
+        else:
+            where, values = "", []
+
+        return f"{where} ORDER BY {self.games_order} LIMIT ?", values
+
+    # столбцы (имя в результате: выражение) и JOIN, нужные для показа атрибута Game в списке игр
+    games_projection = {
+        "date": ({"year": "g.year", "month": "g.month", "day": "g.day", "time": "g.time"}, ()),
+        "time": ({"year": "g.year", "month": "g.month", "day": "g.day", "time": "g.time"}, ()),
+        "league": ({"league": "l.name"}, ("LEFT JOIN League l ON l.id = g.league_id",)),
+        "stadium": ({"stadium": "s.name"}, ("LEFT JOIN Stadium s ON s.id = g.stadium_id",)),
+        "team_home": ({"team_home": "th.name"}, ("LEFT JOIN Team th ON th.id = g.team_home",)),
+        "team_guest": ({"team_guest": "tg.name"}, ("LEFT JOIN Team tg ON tg.id = g.team_guest",)),
+        "referee_chief": ({"referee_chief": "r0.second_name"},
+                          ("LEFT JOIN Referee r0 ON r0.id = g.referee_chief",)),
+        "referee_first": ({"referee_first": "r1.second_name"},
+                          ("LEFT JOIN Referee r1 ON r1.id = g.referee_first",)),
+        "referee_second": ({"referee_second": "r2.second_name"},
+                           ("LEFT JOIN Referee r2 ON r2.id = g.referee_second",)),
+        "referee_reserve": ({"referee_reserve": "r3.second_name"},
+                            ("LEFT JOIN Referee r3 ON r3.id = g.referee_reserve",)),
+        "team_home_year": ({"team_home_year": "g.team_home_year"}, ()),
+        "team_guest_year": ({"team_guest_year": "g.team_guest_year"}, ()),
+        "game_passed": ({"game_passed": "g.game_passed"}, ()),
+        "pay_done": ({"pay_done": "g.pay_done"}, ()),
+        "payment": ({"payment": "g.payment"}, ()),
+        "status": ({"game_passed": "g.game_passed", "pay_done": "g.pay_done"}, ()),
+    }
+
+    def games_page_projection(self, attributes: Sequence[str], after: Optional[Tuple[int, int]] = None,
+                              limit: int = 10) -> List[dict]:
+        """Возвращает страницу игр (в порядке games_order, по ключу последней показанной игры),
+        но только со столбцами, нужными для показа attributes.
+        Вместо id лиги, стадиона, команд и судей сразу возвращаются их имена.
+
+            Parameters:
+                attributes(list) - показываемые атрибуты Game (ключи games_projection).
+                after(tuple) - Game.sort_key последней игры предыдущей страницы (None - первая страница).
+                limit(int) - максимальное количество игр на странице.
+
+            Return:
+                games - список словарей с ключами id, start_at и столбцами из games_projection."""
+
+        tail, values = self._games_page_tail(after)
+        return self._games_projection(attributes, tail, values + [limit])
+
+    def games_projection_by_ids(self, attributes: Sequence[str], ids: Sequence[int]) -> List[dict]:
+        """Возвращает игры с заданными id как games_page_projection, в порядке ids."""
+        if not ids:
+            return []
+
+        tail = f"WHERE g.id IN ({', '.join('?' * len(ids))})"
+        games = {game["id"]: game for game in self._games_projection(attributes, tail, list(ids))}
+        return [games[id_] for id_ in ids if id_ in games]
+
+    @property
+    def games_store(self) -> "GamesStore":
+        """Список игр в памяти для сортировки и фильтрации (загружается при первом обращении)."""
+        with self.lock:
+            if self._games_store is None:
+                self._games_store = GamesStore(self)
+        return self._games_store
+
+    def game_projection(self, attributes: Sequence[str], id_: int) -> Optional[dict]:
+        """Возвращает одну игру как games_page_projection или None, если игры с таким id нет."""
+        games = self._games_projection(attributes, "WHERE g.id = ?", [id_])
+        return games[0] if games else None
+
+    # условия поиска игр (см. games_search): фильтр - (условие WHERE, количество параметров).
+    # Имена ищутся в небольших таблицах сущностей, а найденные id - по индексам games_<столбец> таблицы Games
+    games_search_conditions = {
+        "date_from": ("g.start_at >= ?", 1),
+        "date_to": ("g.start_at <= ?", 1),
+        "stadium": ("g.stadium_id IN (SELECT id FROM Stadium WHERE casefold(name) LIKE ? ESCAPE '\\')", 1),
+        "league": ("g.league_id IN (SELECT id FROM League WHERE casefold(name) LIKE ? ESCAPE '\\')", 1),
+        "team": ("(g.team_home IN (SELECT id FROM Team WHERE casefold(name) LIKE ? ESCAPE '\\')"
+                 " OR g.team_guest IN (SELECT id FROM Team WHERE casefold(name) LIKE ? ESCAPE '\\'))", 2),
+        # судья ищется по имени, как оно показано в списках ("Фамилия Имя")
+        "referee": ("(" + " OR ".join(f"g.{referee} IN (SELECT id FROM Referee"
+                                      f" WHERE casefold({_display_name_sql('referee')}) LIKE ? ESCAPE '\\')"
+                                      for referee in referee_columns) + ")", 4),
+    }
+
+    # условия статуса игры (ключи Game.status_icn), используют индекс games_status
+    games_status_conditions = {
+        "not_passed": "(g.game_passed = 0 OR g.game_passed IS NULL)",
+        "passed": "g.game_passed = 1 AND (g.pay_done = 0 OR g.pay_done IS NULL)",
+        "pay_done": "g.game_passed = 1 AND g.pay_done = 1",
+    }
+
+    def games_search(self, attributes: Sequence[str], filters: dict, after: Optional[Tuple[int, int]] = None,
+                     limit: int = 10) -> List[dict]:
+        """Возвращает страницу игр (как games_page_projection), подходящих под filters.
+
+            Parameters:
+                attributes(list) - показываемые атрибуты Game (ключи games_projection).
+                filters(dict) - фильтры: date_from, date_to (datetime.date, включительно), stadium, league, team,
+                                referee (часть имени без учета регистра; referee - в любой из судейских позиций),
+                                status (ключ Game.status_icn).
+                after(tuple) - Game.sort_key последней игры предыдущей страницы (None - первая страница).
+                limit(int) - максимальное количество игр на странице."""
+
+        where, values = self._games_search_where(filters)
+        tail, page_values = self._games_page_tail(after)
+        if where:
+            # условие страницы из _games_page_tail добавляется к условиям поиска
+            tail = tail.replace("WHERE ", f"{where} AND ", 1) if after else f"{where} {tail}"
+        return self._games_projection(attributes, tail, values + page_values + [limit])
+
+    def games_search_count(self, filters: dict) -> int:
+        """Количество игр, подходящих под filters (см. games_search)."""
+        where, values = self._games_search_where(filters)
+        return self._select_request(f"SELECT COUNT(*) FROM Games g {where}", values, one_value=True)[0]
+
+    def games_search_ids(self, filters: dict) -> Set[int]:
+        """id всех игр, подходящих под filters (см. games_search), например для GamesStore.select(ids=...)."""
+        where, values = self._games_search_where(filters)
+        return {id_ for id_, in self._select_request(f"SELECT g.id FROM Games g {where}", values)}
+
+    def _games_search_where(self, filters: dict) -> Tuple[str, list]:
+        conditions, values = [], []
+        for name, value in filters.items():
+            if value is None or value == "":
+                continue
+
+            if name == "status":
+                if value not in self.games_status_conditions:
+                    raise ValueError(f"Unknown game status {value!r}")
+                conditions.append(self.games_status_conditions[value])
+            elif name in ("date_from", "date_to"):
+                conditions.append(self.games_search_conditions[name][0])
+                time_ = 0 if name == "date_from" else 2359
+                values.append(GamesStore._start_at(value, time_))
+            elif name in self.games_search_conditions:
+                condition, count = self.games_search_conditions[name]
+                conditions.append(condition)
+                pattern = "%" + re.sub(r"([\\%_])", r"\\\1", str(value).strip().casefold()) + "%"
+                values += [pattern] * count
+            else:
+                raise ValueError(f"Unknown games filter {name!r}")
+
+        return ("WHERE " + " AND ".join(conditions) if conditions else ""), values
+
+    def _games_projection(self, attributes: Sequence[str], tail: str, values: list) -> List[dict]:
+        attributes = tuple(attributes)
+        names, sql = self._cached_sql(("games_projection", attributes, tail),
+                                      lambda: self._build_games_projection_sql(attributes, tail))
+        return [dict(zip(names, row)) for row in self._select_request(sql, values)]
+
+    def _build_games_projection_sql(self, attributes: Tuple[str, ...], tail: str) -> Tuple[Tuple[str, ...], str]:
+        """Собирает SELECT только нужных для attributes столбцов и JOIN.
+
+            Return:
+                names(tuple) - имена столбцов результата.
+                sql(str) - запрос."""
+
+        columns = {"id": "g.id", "start_at": "g.start_at"}
+        joins = []
+        for attribute in attributes:
+            if attribute not in self.games_projection:
+                raise ValueError(f"Game attribute {attribute!r} can not be projected")
+            attribute_columns, attribute_joins = self.games_projection[attribute]
+            columns.update(attribute_columns)
+            joins += [join for join in attribute_joins if join not in joins]
+
+        sql = f'''SELECT {", ".join(columns.values())} FROM Games g {" ".join(joins)} {tail}'''
+        return tuple(columns), sql
+
+    def game(self, id_: int) -> Optional[dict]:
+        """Возвращает одну игру вместе со связанными сущностями (League, Stadium, Team и Referee вместо id)
+        или None, если игры с таким id нет."""
+
+        games = self._games_with_relations(self._games_join_sql("WHERE g.id = ?"), [id_])
+        return games[0] if games else None
+
+    @property
+    def games_count(self) -> int:
+        """Количество игр в БД."""
+        return self._select_request("SELECT COUNT(*) FROM Games", one_value=True)[0]
+
+    @property
+    def names_fts_available(self) -> bool:
+        """Создан ли в БД полнотекстовый индекс имен NamesFTS (см. _migration_names_fts)."""
+        return "namesfts" in self._schemas[self.path_db]
+
+    def search_names(self, table: str, text: str, limit: int = 10) -> List[str]:
+        """Нечеткий поиск показываемых имен таблицы table: находит имена, набранные с опечатками или латиницей.
+        Сначала идут имена, содержащие text, затем остальные по убыванию сходства (ранг FTS5 по общим триграммам).
+        Без NamesFTS или для text короче трех символов ищет только точные совпадения (NameIndex.search).
+
+            Return:
+                names - до limit имен."""
+
+        query = _trigram_query(text)
+        if not query or not self.names_fts_available:
+            return name_index(table).search(text, limit)
+
+        sql = '''SELECT name FROM NamesFTS WHERE NamesFTS MATCH ? AND rowid % 8 = ?
+                 ORDER BY instr(casefold(name), ?) = 0, rank LIMIT ?'''
+        rows = self._select_request(sql, [query, self.names_fts_tables.index(table.lower()),
+                                          text.strip().casefold(), limit])
+        return [name for name, in rows]
+
+    def games_summary(self) -> Dict[str, Tuple[int, int]]:
+        """Количество игр и сумма их оплаты по статусам без просмотра всех игр (счетчики GamesSummary
+        поддерживаются триггерами).
+
+            Return:
+                summary - словарь, где ключ - статус игры (ключ Game.status_icn),
+                          а значение - (количество игр, сумма payment)."""
+
+        summary = {status: (0, 0) for status in Game.status_icn}
+        for status, games, payment in self._select_request("SELECT status, games, payment FROM GamesSummary"):
+            summary[status] = (games, payment)
+        return summary
+
+    def _games_join_sql(self, tail: str = "") -> str:
+        """Собирает SELECT игр с LEFT JOIN всех связанных таблиц.
+
+            Parameters:
+                tail(str) - окончание запроса (WHERE, ORDER BY, LIMIT)."""
+
+        return self._cached_sql(("games", tail), lambda: self._build_games_join_sql(tail))
+
+    def _build_games_join_sql(self, tail: str) -> str:
+        columns = [f"g.{c}" for c in self.games_columns]
+        columns += ["l.name",
+                    "s.name", "s.address", "s.city_id", "ci.name",
+                    "th.name", "tg.name"]
+        joins = ["LEFT JOIN League l ON l.id = g.league_id",
+                 "LEFT JOIN Stadium s ON s.id = g.stadium_id",
+                 "LEFT JOIN City ci ON ci.id = s.city_id",
+                 "LEFT JOIN Team th ON th.id = g.team_home",
+                 "LEFT JOIN Team tg ON tg.id = g.team_guest"]
+
+        for inx, referee in enumerate(self.referee_columns):
+            columns += [f"r{inx}.first_name", f"r{inx}.second_name", f"r{inx}.third_name", f"r{inx}.phone",
+                        f"r{inx}.category_id", f"c{inx}.name"]
+            joins += [f"LEFT JOIN Referee r{inx} ON r{inx}.id = g.{referee}",
+                      f"LEFT JOIN Category c{inx} ON c{inx}.id = r{inx}.category_id"]
+
+        return f'''SELECT {", ".join(columns)} FROM Games g {" ".join(joins)} {tail}'''
+
+    def _games_with_relations(self, sql: str, values: Optional[list] = None) -> List[dict]:
+        """Выполняет запрос, собранный _games_join_sql, и создает из строк связанные объекты без
+        дополнительных запросов. Уже созданные сущности берутся из identity_maps."""
+
+        def entity(key: tuple, factory):
+            return identity_maps[key[0].lower()].get(key[1:], factory)
+
+        games = []
+        count = len(self.games_columns)
+        for row in self._select_request(sql, values):
+            game = dict(zip(self.games_columns, row[:count]))
+            league_name, stadium_name, address, city_id, city_name, home_name, guest_name = row[count:count + 7]
+            referee_data = row[count + 7:]
+
+            if game["league_id"]:
+                game["league_id"] = entity(("League", game["league_id"]),
+                                           lambda: League.from_data(game["league_id"], league_name))
+            if game["stadium_id"]:
+                city = entity(("City", city_id), lambda: City.from_data(city_id, city_name))
+                game["stadium_id"] = entity(("Stadium", game["stadium_id"]),
+                                            lambda: Stadium.from_data(game["stadium_id"], stadium_name,
+                                                                      address, city))
+
+            for team, name in (("team_home", home_name), ("team_guest", guest_name)):
+                if game[team]:
+                    age = game[f"{team}_year"]
+                    game[team] = entity(("Team", game[team], age),
+                                        lambda: Team.from_data(game[team], name, age))
+
+            for inx, referee in enumerate(self.referee_columns):
+                first, second, third, phone, category_id, category_name = referee_data[inx * 6:inx * 6 + 6]
+                if game[referee]:
+                    category = entity(("Category", category_id),
+                                      lambda: Category.from_data(category_id, category_name))
+                    game[referee] = entity(("Referee", game[referee]),
+                                           lambda: Referee.from_data(game[referee], first, second, third,
+                                                                     phone, category))
+            games.append(game)
+
+        return games
+
     def take_data(self, what_return: str, table: str,
                   conditions: dict = None,
                   one_value: bool = False, order: dict = None) -> Union[str, list]:
-        values = None
-        if conditions:
-            conditions_str, values = self._convert_conditions(conditions)
-            sql = f'''SELECT {what_return} FROM {table} WHERE {conditions_str}'''
-
-        else:
-            sql = f'''SELECT {what_return} FROM {table}'''
+        columns = tuple(column.strip() for column in what_return.split(","))
+        condition_keys = tuple(conditions) if conditions else ()
+        order_items = tuple((key, tuple(order[key])) for key in order) if order else ()
 
-        if order:
-            order_str = self._convert_order(order)
-            sql += f''' ORDER BY {order_str}'''
-        # #print(sql)
+        sql = self._cached_sql(("select", table, columns, condition_keys, order_items),
+                               lambda: self._select_sql(table, columns, condition_keys, order_items))
+        values = [conditions[key] for key in condition_keys] or None
         return self._select_request(sql, values, one_value=one_value)
 
+    # максимальное количество id в одном запросе take_by_ids (старые SQLite ограничивают число параметров 999)
+    max_ids_in_request = 500
+
+    def take_by_ids(self, columns: Sequence[str], table: str, ids: Sequence[int]) -> list:
+        """Возвращает строки таблицы table с заданными id (в любом порядке) несколькими запросами WHERE id IN (...).
+
+            Parameters:
+                columns(list) - возвращаемые столбцы.
+                table(str) - название таблицы.
+                ids(list) - id строк."""
+
+        checked_table = self._checked_table(table, tuple(columns) + ("id",))
+        rows = []
+        for start in range(0, len(ids), self.max_ids_in_request):
+            part = list(ids[start:start + self.max_ids_in_request])
+            sql = self._cached_sql(("by_ids", checked_table, tuple(columns), len(part)),
+                                   lambda: f'''SELECT {", ".join(columns)} FROM {checked_table} '''
+                                           f'''WHERE id IN ({", ".join("?" * len(part))})''')
+            rows += self._select_request(sql, part)
+        return rows
+
+    def _select_sql(self, table: str, columns: tuple, condition_keys: tuple, order_items: tuple) -> str:
+        order_columns = tuple(column for _, order_columns in order_items for column in order_columns)
+        table = self._checked_table(table, columns + condition_keys + order_columns)
+
+        sql = f'''SELECT {", ".join(columns)} FROM {table}'''
+        if condition_keys:
+            sql += f''' WHERE {self._convert_conditions(dict.fromkeys(condition_keys))[0]}'''
+        if order_items:
+            sql += f''' ORDER BY {self._convert_order({key: list(value) for key, value in order_items})}'''
+        return sql
+
+    def _cached_sql(self, key: tuple, build: Callable[[], Any]) -> Any:
+        """Возвращает шаблон SQL по ключу key (таблица, столбцы, ключи условий, сортировка),
+        собирая его функцией build только при первом запросе."""
+        sql = self._sql_cache.get(key)
+        if sql is None:
+            sql = self._sql_cache[key] = build()
+        return sql
+
+    def _checked_table(self, table: str, columns: tuple = ()) -> str:
+        """Проверяет по схеме БД, что таблица table и ее столбцы columns существуют.
+
+            Return:
+                table(str) - название таблицы, как оно записано в БД."""
+
+        try:
+            name, table_columns = self._schemas[self.path_db][table.lower()]
+        except KeyError:
+            raise ValueError(f"Table {table!r} is not in the database") from None
+
+        for column in columns:
+            if column != "*" and column.lower() not in table_columns:
+                raise ValueError(f"Table {name!r} has no column {column!r}")
+        return name
+
     def insert(self, table: str, data: dict) -> None:
         """Добавляет в БД заданные данные."""
-        # #print(data)
-        for k, v in data.items():
-            data[k] = int(v) if type(v) == str and v.isdigit() else v
+        sql, values = self._insert_sql(table, data)
 
-        column = ','.join(d for d in data.keys())
-        count_values = ','.join('?' * len(data.values()))
-        values = [d for d in data.values()]
+        with self.lock:
+            row_id = self._request(sql, values)
+            self._after_write(table, "insert", data, {"id": row_id})
 
-        sql = f'''INSERT INTO {table}({column}) VALUES ({count_values}); '''
+    def insert_many(self, table: str, data: List[dict]) -> None:
+        """Добавляет в БД несколько строк одним запросом executemany в одной транзакции.
+
+            Parameters:
+                table(str) - название таблицы.
+                data(list) - список словарей с одинаковыми ключами (столбец - значение)."""
 
-        # #print(sql, values)
-        self._request(sql, values)
+        if not data:
+            return
+
+        sql, _ = self._insert_sql(table, data[0])
+        values = [self._insert_sql(table, row)[1] for row in data]
+        assert all(row.keys() == data[0].keys() for row in data), "all rows in data must have the same keys"
+
+        with self.batch():
+            self._request(sql, values, many=True)
+            # id добавленных строк неизвестны, поэтому conditions пустые
+            self._after_write(table, "insert", {}, {})
 
     def update(self, table: str, data: dict, conditions: dict):
         """Обновляет БД."""
+        sql, values = self._update_sql(table, data, conditions)
+
+        with self.lock:
+            self._request(sql, values)
+            self._after_write(table, "update", data, conditions)
 
+    def update_many(self, table: str, data: List[dict], conditions: List[dict]) -> None:
+        """Обновляет несколько строк одним запросом executemany в одной транзакции.
+
+            Parameters:
+                table(str) - название таблицы.
+                data(list) - список словарей с одинаковыми ключами (столбец - новое значение).
+                conditions(list) - список условий для каждого словаря из data, с одинаковыми ключами."""
+
+        assert len(data) == len(conditions), "data and conditions must have the same length"
+        if not data:
+            return
+
+        sql, _ = self._update_sql(table, data[0], conditions[0])
+        values = [self._update_sql(table, row, condition)[1] for row, condition in zip(data, conditions)]
+        assert all(row.keys() == data[0].keys() for row in data) \
+               and all(condition.keys() == conditions[0].keys() for condition in conditions), \
+            "all rows in data and all conditions must have the same keys"
+
+        with self.batch():
+            self._request(sql, values, many=True)
+            for row, condition in zip(data, conditions):
+                self._after_write(table, "update", row, condition)
+
+    @contextmanager
+    def batch(self):
+        """Контекстный менеджер транзакции: все записи внутри блока with фиксируются одним commit
+        при выходе из блока или отменяются целиком при исключении. Вложенные batch входят во внешний.
+
+        Пример:
+            with MainApp.DB.batch():
+                MainApp.DB.update(...)
+                MainApp.DB.insert(...)"""
+
+        # другие потоки ждут окончания транзакции
+        with self.lock:
+            self._batch.depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch.depth -= 1
+                if not self._batch.depth:
+                    self._finish_batch(commit=False)
+                raise
+            else:
+                self._batch.depth -= 1
+                if not self._batch.depth:
+                    self._finish_batch(commit=True)
+
+    def _finish_batch(self, commit: bool) -> None:
+        """Завершает транзакцию batch и оповещает write_listeners о зафиксированных записях."""
+        writes, self._batch.writes = self._batch.writes, []
+        try:
+            if commit:
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+        except sqlite3.Error:
+            commit = False
+            self.connection.rollback()
+            raise
+        finally:
+            for table, action, data, conditions in writes:
+                if commit:
+                    self._notify_write_listeners(table, action, data, conditions)
+                else:
+                    # пока транзакция была открыта, в кэш могли попасть отмененные данные
+                    invalidate_identity_map(table)
+
+    def _insert_sql(self, table: str, data: dict) -> Tuple[str, list]:
         for k, v in data.items():
             data[k] = int(v) if type(v) == str and v.isdigit() else v
 
-        column = ','.join(f'{d}=?' for d in data.keys())
+        columns = tuple(data)
         values = [d for d in data.values()]
 
-        if conditions:
-            conditions_str, conditions_value = self._convert_conditions(conditions)
-            values.append(*conditions_value)
-            sql = f'''UPDATE {table} SET {column} WHERE {conditions_str}'''
-        else:
-            sql = f'''UPDATE {table} SET {column}'''
+        def build():
+            column = ','.join(columns)
+            count_values = ','.join('?' * len(columns))
+            return f'''INSERT INTO {self._checked_table(table, columns)}({column}) VALUES ({count_values}); '''
 
-        #print("Update")
-        #print(sql, values)
-        #print()
-        self._request(sql, values)
+        return self._cached_sql(("insert", table, columns), build), values
+
+    def _update_sql(self, table: str, data: dict, conditions: dict) -> Tuple[str, list]:
+        for k, v in data.items():
+            data[k] = int(v) if type(v) == str and v.isdigit() else v
+
+        columns = tuple(data)
+        condition_keys = tuple(conditions) if conditions else ()
+        values = [d for d in data.values()] + [conditions[key] for key in condition_keys]
+
+        def build():
+            column = ','.join(f'{d}=?' for d in columns)
+            sql = f'''UPDATE {self._checked_table(table, columns + condition_keys)} SET {column}'''
+            if condition_keys:
+                sql += f''' WHERE {self._convert_conditions(dict.fromkeys(condition_keys))[0]}'''
+            return sql
+
+        return self._cached_sql(("update", table, columns, condition_keys), build), values
 
     def delete(self, table: str, conditions: dict, columns: list = None):
         columns = ", ".join(columns) if columns else ''
         values = []
+        checked_table = self._checked_table(table, tuple(conditions) if conditions else ())
 
         if conditions:
             conditions_str, conditions_value = self._convert_conditions(conditions)
-            values.append(*conditions_value)
-            sql = f'''DELETE {columns} FROM {table} WHERE {conditions_str}'''
+            values.extend(conditions_value)
+            sql = f'''DELETE {columns} FROM {checked_table} WHERE {conditions_str}'''
+
+        else:
+            sql = f'''DELETE {columns} FROM {checked_table}'''
+
+        with self.lock:
+            self._request(sql, values)
+            self._after_write(table, "delete", {}, conditions)
+
+    @classmethod
+    def add_write_listener(cls, listener: Callable[[str, str, dict, dict], None]) -> None:
+        """Добавляет функцию, вызываемую после каждой записи в БД.
 
+            Parameters:
+                listener - функция listener(table, action, data, conditions), где action - 'insert', 'update' или
+                           'delete', а для 'insert' conditions содержит id добавленной строки.
+                           Пустые conditions означают, что могли измениться любые строки таблицы."""
+        cls.write_listeners.append(listener)
+
+    def _after_write(self, table: str, action: str, data: dict, conditions: Optional[dict]) -> None:
+        invalidate_identity_map(table)
+        if self._batch.depth:
+            # внутри batch оповещаем только после commit
+            self._batch.writes.append((table, action, data, conditions or {}))
         else:
-            sql = f'''DELETE {columns} FROM {table}'''
+            self._notify_write_listeners(table, action, data, conditions or {})
 
-        #print("Delete")
-        #print(sql, values)
-        #print()
-        self._request(sql, values)
+    def _notify_write_listeners(self, table: str, action: str, data: dict, conditions: dict) -> None:
+        for listener in self.write_listeners:
+            listener(table, action, data, conditions)
 
     @staticmethod
     def _convert_order(order) -> str:
@@ -272,29 +1394,290 @@ class ConnDB:
         return " AND ".join(name_list), values
 
     def _select_request(self, sql: str, values: Optional[list] = None, one_value: bool = False) -> list:
-        self.cursor = sqlite3.connect(self.path_db).cursor()
-        if values:
-            self.cursor.execute(sql, values)
+        with self.lock:
+            start = time.perf_counter()
+            cursor = self.connection.cursor()
+            try:
+                if values:
+                    cursor.execute(sql, values)
+                else:
+                    cursor.execute(sql)
+
+                if one_value:
+                    data = cursor.fetchone()
+                else:
+                    data = cursor.fetchall()
+            finally:
+                cursor.close()
+
+        rows = (1 if data else 0) if one_value else len(data)
+        self.stats.record(sql, time.perf_counter() - start, rows, values)
+
+        return data
+
+    def _request(self, sql, values, many: bool = False) -> int:
+        """Выполняет запрос на изменение БД. Возвращает id последней добавленной строки.
+        Внутри batch изменения не фиксируются до конца транзакции.
+
+            Parameters:
+                many(bool) - выполнить запрос через executemany, values - список наборов значений."""
+        with self.lock:
+            start = time.perf_counter()
+            conn = self.connection
+            cursor = conn.cursor()
+            try:
+                if many:
+                    cursor.executemany(sql, values)
+                else:
+                    cursor.execute(sql, values)
+                if not self._batch.depth:
+                    conn.commit()
+                self.stats.record(sql, time.perf_counter() - start, cursor.rowcount,
+                                  None if many else values)
+                return cursor.lastrowid
+            except sqlite3.Error:
+                if not self._batch.depth:
+                    conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+
+ConnDB.add_write_listener(_update_name_indexes)
+
+
+class GamesStore:
+    """Список всех игр в памяти в виде параллельных массивов (столбцов) для сортировки и фильтрации
+    без запросов к БД. Хранит только ключевые поля игр, имена берутся из БД один раз на таблицу.
+    Изменения игр применяются после каждой записи в БД (см. ConnDB.add_write_listener)."""
+
+    # столбцы Games и типы массивов array (NULL хранится как 0)
+    columns = {"id": "q",
+               "start_at": "q",
+               "game_passed": "b",
+               "pay_done": "b",
+               "payment": "q",
+               "league_id": "q",
+               "stadium_id": "q",
+               }
+
+    # атрибуты Game, по которым можно сортировать (см. _sort_key)
+    sort_columns = ("id", "date", "time", "status", "payment", "league", "stadium")
+
+    # таблицы имен для сортировки по league и stadium
+    _name_tables = {"league": ("League", "league_id"),
+                    "stadium": ("Stadium", "stadium_id"),
+                    }
+
+    def __init__(self, db: "ConnDB"):
+        self.db = db
+        self._lock = threading.RLock()
+        self._names: Dict[str, Dict[int, str]] = {}
+        self.load()
+        ConnDB.add_write_listener(self._on_db_write)
+
+    def __len__(self):
+        return len(self.arrays["id"])
+
+    def load(self) -> None:
+        """Загружает все игры из БД одним запросом."""
+        sql = f'''SELECT {", ".join(self.columns)} FROM Games'''
+        arrays = {column: array(type_) for column, type_ in self.columns.items()}
+        for row in self.db._select_request(sql):
+            for values, value in zip(arrays.values(), row):
+                values.append(value or 0)
+
+        with self._lock:
+            self.arrays = arrays
+            # позиция игры в массивах по id
+            self._positions = {id_: inx for inx, id_ in enumerate(arrays["id"])}
+
+    def select(self, order_by: str = "date", descending: bool = True, status: Optional[str] = None,
+               date_from: Optional[datetime.date] = None, date_to: Optional[datetime.date] = None,
+               min_payment: Optional[int] = None, max_payment: Optional[int] = None,
+               ids: Optional[Set[int]] = None) -> List[int]:
+        """Возвращает id игр, подходящих под фильтры, в заданном порядке.
+
+            Parameters:
+                order_by(str) - атрибут Game для сортировки (один из sort_columns).
+                descending(bool) - сортировать по убыванию. Равные значения упорядочены по id в том же направлении.
+                status(str) - ключ Game.status_icn ('not_passed', 'passed' или 'pay_done').
+                date_from, date_to(date) - первый и последний день игр (включительно).
+                min_payment, max_payment(int) - границы оплаты (включительно).
+                ids(set) - id игр, среди которых выбирать (например, найденные ConnDB.games_search_ids).
+
+            Return:
+                ids - список id игр."""
+
+        if order_by not in self.sort_columns:
+            raise ValueError(f"GamesStore can not sort by {order_by!r}")
+
+        # имена загружаются из БД до блокировки массивов: запись в БД берет блокировки в обратном порядке
+        # (ConnDB.lock, затем _lock в _reload_game)
+        names = self._table_names(order_by) if order_by in self._name_tables else None
+
+        with self._lock:
+            arrays = self.arrays
+            masks = []
+            if status is not None:
+                masks.append(self._status_mask(status))
+            if date_from is not None:
+                masks.append(map(operator.ge, arrays["start_at"], repeat(self._start_at(date_from))))
+            if date_to is not None:
+                masks.append(map(operator.le, arrays["start_at"], repeat(self._start_at(date_to, 2359))))
+            if min_payment is not None:
+                masks.append(map(operator.ge, arrays["payment"], repeat(min_payment)))
+            if max_payment is not None:
+                masks.append(map(operator.le, arrays["payment"], repeat(max_payment)))
+            if ids is not None:
+                masks.append(map(ids.__contains__, arrays["id"]))
+
+            positions = range(len(arrays["id"]))
+            if masks:
+                positions = compress(positions, map(all, zip(*masks)))
+
+            # сначала по id, затем устойчивой сортировкой по столбцу: равные значения остаются упорядочены по id
+            positions = sorted(positions, key=arrays["id"].__getitem__, reverse=descending)
+            if order_by != "id":
+                positions.sort(key=self._sort_key(order_by, names), reverse=descending)
+
+            ids = arrays["id"]
+            return [ids[inx] for inx in positions]
+
+    def _status_mask(self, status: str):
+        passed, pay_done = self.arrays["game_passed"], self.arrays["pay_done"]
+        if status == "not_passed":
+            return map(operator.not_, passed)
+        elif status == "passed":
+            return map(operator.gt, passed, pay_done)
+        elif status == "pay_done":
+            return map(operator.and_, passed, pay_done)
+        raise ValueError(f"Unknown game status {status!r}")
+
+    def _sort_key(self, order_by: str, names: Optional[Dict[int, str]] = None) -> Callable[[int], Any]:
+        arrays = self.arrays
+        if order_by == "date":
+            return arrays["start_at"].__getitem__
+        elif order_by == "time":
+            # время игры хранится в младших разрядах start_at (ЧЧММ)
+            start_at = arrays["start_at"]
+            return lambda inx: start_at[inx] % 10000
+        elif order_by == "status":
+            passed, pay_done = arrays["game_passed"], arrays["pay_done"]
+            return lambda inx: passed[inx] + (passed[inx] and pay_done[inx])
+        elif order_by == "payment":
+            return arrays["payment"].__getitem__
         else:
-            self.cursor.execute(sql)
+            ids = arrays[self._name_tables[order_by][1]]
+            return lambda inx: names.get(ids[inx], "")
+
+    def _table_names(self, attribute: str) -> Dict[int, str]:
+        """Имена лиг или стадионов по id (загружаются из БД один раз до изменения таблицы)."""
+        names = self._names.get(attribute)
+        if names is None:
+            table = self._name_tables[attribute][0]
+            rows = self.db.take_data("id, name", table, one_value=False)
+            names = self._names[attribute] = {id_: (name or "").lower() for id_, name in rows}
+        return names
 
-        if one_value:
-            data = self.cursor.fetchone()
+    @staticmethod
+    def _start_at(date: datetime.date, time_: int = 0) -> int:
+        return date.year * 100000000 + date.month * 1000000 + date.day * 10000 + time_
+
+    def _on_db_write(self, table: str, action: str, data: dict, conditions: dict) -> None:
+        table = table.lower()
+        if table == "games":
+            if conditions.keys() == {"id"}:
+                self._reload_game(conditions["id"])
+            else:
+                self.load()
         else:
-            data = self.cursor.fetchall()
+            for attribute, (name_table, _) in self._name_tables.items():
+                if table == name_table.lower():
+                    self._names.pop(attribute, None)
+
+    def _reload_game(self, id_: int) -> None:
+        """Обновляет в массивах одну игру: добавляет, изменяет или удаляет (если ее больше нет в БД)."""
+        sql = f'''SELECT {", ".join(self.columns)} FROM Games WHERE id = ?'''
+        row = self.db._select_request(sql, [id_], one_value=True)
+
+        with self._lock:
+            arrays = self.arrays
+            inx = self._positions.get(id_)
+            if row is None:
+                if inx is not None:
+                    # удаление перестановкой последней игры на место удаляемой
+                    last = len(arrays["id"]) - 1
+                    for values in arrays.values():
+                        values[inx] = values[last]
+                        del values[last]
+                    del self._positions[id_]
+                    if inx != last:
+                        self._positions[arrays["id"][inx]] = inx
+            elif inx is None:
+                for values, value in zip(arrays.values(), row):
+                    values.append(value or 0)
+                self._positions[id_] = len(arrays["id"]) - 1
+            else:
+                for values, value in zip(arrays.values(), row):
+                    values[inx] = value or 0
 
-        #print("Select")
-        #print(sql, values)
-        #print()
-        self.cursor.close()
 
-        return data
+class LazyRelation:
+    """Связанная с игрой сущность. В игре хранится только ее ключ (id и дополнительные параметры),
+    а объект берется из identity_maps (или загружается из БД) при первом обращении к атрибуту.
+    Для списков игр связанные объекты можно загрузить заранее одним запросом на таблицу (Game.prefetch)."""
+
+    def __init__(self, entity: str, column: str, *args_columns: str):
+        """Parameters:
+            entity(str) - название класса сущности (классы сущностей объявлены ниже Game).
+            column(str) - столбец Games с id сущности.
+            args_columns(str) - столбцы Games с дополнительными параметрами ключа (возраст команды)."""
 
-    def _request(self, sql, values):
-        self.conn = sqlite3.connect(self.path_db)
-        self.cur = self.conn.cursor()
-        self.cur.execute(sql, values)
-        self.conn.commit()
+        self.entity = entity
+        self.column = column
+        self.args_columns = args_columns
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        # атрибуты игры, где хранятся id сущности и уже созданный объект
+        self.id_name = f"{name}_id"
+        self.value_name = f"_{name}"
+
+    @property
+    def entity_cls(self) -> type:
+        return globals()[self.entity]
+
+    def __get__(self, game, owner=None):
+        if game is None:
+            return self
+
+        value = getattr(game, self.value_name, _not_loaded)
+        if value is _not_loaded:
+            key = self.key(game)
+            value = self.entity_cls.get(*key) if key[0] else None
+            setattr(game, self.value_name, value)
+        return value
+
+    def __set__(self, game, value):
+        """Принимает уже созданный объект сущности, его id или None."""
+        if isinstance(value, self.entity_cls):
+            setattr(game, self.id_name, value.id)
+            setattr(game, self.value_name, value)
+        else:
+            setattr(game, self.id_name, value)
+            setattr(game, self.value_name, _not_loaded if value else None)
+
+    def key(self, game) -> tuple:
+        """Ключ сущности в identity_maps: (id, *дополнительные параметры)."""
+        return (getattr(game, self.id_name), *(getattr(game, column) for column in self.args_columns))
+
+    def is_loaded(self, game) -> bool:
+        return getattr(game, self.value_name, _not_loaded) is not _not_loaded
+
+
+# значение еще не загруженной связанной сущности (см. LazyRelation)
+_not_loaded = object()
 
 
 class Game:
@@ -320,10 +1703,27 @@ class Game:
                  "status",
                  )
 
+    # связанные сущности загружаются при первом обращении
+    referee_chief = LazyRelation("Referee", "referee_chief")
+    referee_first = LazyRelation("Referee", "referee_first")
+    referee_second = LazyRelation("Referee", "referee_second")
+    referee_reserve = LazyRelation("Referee", "referee_reserve")
+    league = LazyRelation("League", "league_id")
+    stadium = LazyRelation("Stadium", "stadium_id")
+    team_home = LazyRelation("Team", "team_home", "team_home_year")
+    team_guest = LazyRelation("Team", "team_guest", "team_guest_year")
+
+    relations = ("referee_chief", "referee_first", "referee_second", "referee_reserve",
+                 "league", "stadium", "team_home", "team_guest")
+
+    # без __dict__ у каждой игры: в памяти может храниться много игр
+    __slots__ = ("id_in_db", "date", "team_home_year", "team_guest_year", "game_passed", "pay_done", "payment",
+                 *(f"{name}_id" for name in relations), *(f"_{name}" for name in relations))
+
     def __init__(self, **kwargs):
+        """Принимает столбцы таблицы Games. Вместо id связанных сущностей можно передать уже созданные
+        объекты (как в ConnDB.game), иначе они будут загружены при первом обращении."""
         self.id_in_db = kwargs.pop("id", None)
-        self.referee_chief = self.referee_first = self.referee_second = self.referee_reserve \
-            = self.league = self.stadium = self.team_home = self.team_guest = None
 
         year = kwargs.pop("year", None)
         month = kwargs.pop("month", None)
@@ -332,42 +1732,82 @@ class Game:
         hour, minute = int(time_) // 100, int(time_) % 100
         self.date = datetime.datetime(year, month, day, hour=hour, minute=minute)
 
-        self._set_referee(**kwargs)
-        self._set_league(**kwargs)
-        self._set_stadium(**kwargs)
-        self._set_team(**kwargs)
+        self.team_home_year = kwargs.pop("team_home_year", None)
+        self.team_guest_year = kwargs.pop("team_guest_year", None)
+        for name in self.relations:
+            relation = getattr(__class__, name)
+            setattr(self, name, kwargs.pop(relation.column, None))
 
         self.game_passed = bool(kwargs.pop("game_passed", None))
         self.pay_done = bool(kwargs.pop("pay_done", None))
         self.payment = kwargs.pop("payment", None)
-        self.status_key = self._get_status(self.game_passed, self.pay_done)
-        self.status = self.status_icn[self.status_key]
 
     def __repr__(self):
         return f"{__class__.__name__} with id {self.id_in_db!r}"
 
-    def _set_referee(self, **kwargs):
-        for referee in ["referee_chief", "referee_first", "referee_second", "referee_reserve"]:
-            referee_id = kwargs.pop(referee, None)
-            referee_obj = Referee(referee_id) if referee_id else None
-            setattr(self, referee, referee_obj)
-
-    def _set_league(self, **kwargs):
-        league_id = kwargs.pop("league_id", None)
-        league_obj = League(league_id) if league_id else None
-        setattr(self, "league", league_obj)
-
-    def _set_stadium(self, **kwargs):
-        stadium_id = kwargs.pop("stadium_id", None)
-        stadium_obj = Stadium(stadium_id) if stadium_id else None
-        setattr(self, "stadium", stadium_obj)
-
-    def _set_team(self, **kwargs):
-        for team in ["team_home", "team_guest"]:
-            team_id = kwargs.pop(team, None)
-            team_age = kwargs.pop(f"{team}_year", None)
-            team_obj = Team(team_id, team_age) if team_id else None
-            setattr(self, team, team_obj)
+    def apply_update(self, data: dict) -> None:
+        """Применяет к игре значения столбцов Games, записанные в БД (как в ConnDB.update),
+        без повторной загрузки игры. Связанные сущности загрузятся заново при обращении.
+
+            Parameters:
+                data(dict) - столбцы таблицы Games и их новые значения."""
+
+        date_parts = {name: int(data[name]) for name in ("year", "month", "day") if name in data}
+        if "time" in data:
+            date_parts.update(hour=int(data["time"]) // 100, minute=int(data["time"]) % 100)
+        if date_parts:
+            self.date = self.date.replace(**date_parts)
+
+        for name in ("team_home_year", "team_guest_year", "payment"):
+            if name in data:
+                setattr(self, name, data[name])
+        for name in ("game_passed", "pay_done"):
+            if name in data:
+                setattr(self, name, bool(data[name]))
+
+        for name in self.relations:
+            relation = getattr(__class__, name)
+            if relation.column in data:
+                setattr(self, name, data[relation.column])
+            elif any(column in data for column in relation.args_columns):
+                # изменился возраст команды - ключ сущности другой
+                setattr(self, name, getattr(self, relation.id_name))
+
+    @property
+    def status_key(self) -> str:
+        return self._get_status(self.game_passed, self.pay_done)
+
+    @property
+    def status(self) -> tuple:
+        """Иконка, цвет и название статуса (общий для всех игр кортеж из status_icn)."""
+        return self.status_icn[self.status_key]
+
+    @property
+    def sort_key(self) -> Tuple[int, int]:
+        """Ключ игры в порядке ConnDB.games_order: (start_at, id)."""
+        start_at = int(self.date.strftime("%Y%m%d%H%M"))
+        return start_at, self.id_in_db
+
+    @classmethod
+    def prefetch(cls, games: Sequence["Game"], *relations: str) -> None:
+        """Загружает связанные сущности игр одним запросом на таблицу, а не отдельным запросом на каждую игру.
+
+            Parameters:
+                games(list) - игры.
+                relations(str) - названия связей (из Game.relations), по умолчанию все."""
+
+        relations = [getattr(cls, name) for name in relations or cls.relations]
+        keys = defaultdict(set)
+        for relation in relations:
+            keys[relation.entity].update(relation.key(game) for game in games if not relation.is_loaded(game))
+
+        for entity, entity_keys in keys.items():
+            globals()[entity].prefetch(entity_keys)
+
+        # объекты уже в identity_maps, обращение к атрибуту запоминает их в игре без запросов
+        for relation in relations:
+            for game in games:
+                relation.__get__(game)
 
     @staticmethod
     def _get_status(game_passed: bool, pay_done: bool) -> Union[str, tuple]:
@@ -388,11 +1828,72 @@ class Game:
             return "not_passed"
 
 
-class Referee:
+class DBEntity:
+    """Базовый класс объектов, создаваемых по id из таблицы table.
+    Объекты одной строки общие для всех игр (см. identity_maps), атрибуты хранятся в __slots__."""
+    __slots__ = ("id",)
+    table = ""
+    # столбцы table, из которых объект создается в prefetch (см. _from_row)
+    columns = ("name",)
+
+    @classmethod
+    def get(cls, id_: int, *args):
+        """Возвращает объект с данным id из identity_maps, создавая его только при отсутствии в кэше."""
+        return identity_maps[cls.table.lower()].get((id_, *args), lambda: cls(id_, *args))
+
+    @classmethod
+    def prefetch(cls, keys: Iterable[tuple]) -> None:
+        """Загружает в identity_maps одним запросом все объекты с ключами keys ((id, *args)), которых там еще нет."""
+        identity_map = identity_maps[cls.table.lower()]
+        missing = {key for key in keys if key[0] and key not in identity_map}
+        if not missing:
+            return
+
+        ids = sorted({key[0] for key in missing})
+        rows = {row[0]: row[1:] for row in shared_db().take_by_ids(("id",) + cls.columns, cls.table, ids)}
+        cls._prefetch_related(rows.values())
+
+        for key in missing:
+            if key[0] in rows:
+                identity_map.get(key, lambda: cls._from_row(key, rows[key[0]]))
+
+    @classmethod
+    def _prefetch_related(cls, rows: Iterable[tuple]) -> None:
+        """Загружает сущности, на которые ссылаются загруженные prefetch строки."""
+
+    @classmethod
+    def _from_row(cls, key: tuple, row: tuple):
+        """Создает объект по ключу key и строке из столбцов columns."""
+        return cls.from_data(key[0], *row, *key[1:])
+
+
+class Referee(DBEntity):
+    __slots__ = ("first_name", "second_name", "third_name", "phone", "category")
+    table = "Referee"
+    columns = ("first_name", "second_name", "third_name", "phone", "category_id")
+
+    @classmethod
+    def _prefetch_related(cls, rows: Iterable[tuple]) -> None:
+        Category.prefetch((row[4],) for row in rows)
+
+    @classmethod
+    def _from_row(cls, key: tuple, row: tuple):
+        *names, category_id = row
+        return cls.from_data(key[0], *names, Category.get(category_id))
+
     def __init__(self, id_: int):
         self.id = id_
         self.first_name, self.second_name, self.third_name, self.phone, category_id = self._get_attr_from_db()[0]
-        self.category = Category(category_id)
+        self.category = Category.get(category_id)
+
+    @classmethod
+    def from_data(cls, id_: int, first_name, second_name, third_name, phone, category):
+        """Создает объект из уже загруженных данных, не обращаясь к БД."""
+        obj = cls.__new__(cls)
+        obj.id = id_
+        obj.first_name, obj.second_name, obj.third_name, obj.phone = first_name, second_name, third_name, phone
+        obj.category = category
+        return obj
 
     def __repr__(self):
         return f"{__class__.__name__} {self.second_name!r} {self.first_name!r}"
@@ -418,11 +1919,22 @@ class Referee:
         return name.strip()
 
 
-class League:
+class League(DBEntity):
+    __slots__ = ("name",)
+    table = "League"
+
     def __init__(self, id_: int):
         self.id = id_
         self.name = self._get_name_from_db()
 
+    @classmethod
+    def from_data(cls, id_: int, name):
+        """Создает объект из уже загруженных данных, не обращаясь к БД."""
+        obj = cls.__new__(cls)
+        obj.id = id_
+        obj.name = name
+        return obj
+
     def __repr__(self):
         return f"{__class__.__name__} {self.name!r}"
 
@@ -430,11 +1942,32 @@ class League:
         return take_one_data("name", "League", {"id": self.id})
 
 
-class Stadium:
+class Stadium(DBEntity):
+    __slots__ = ("name", "address", "city")
+    table = "Stadium"
+    columns = ("name", "address", "city_id")
+
+    @classmethod
+    def _prefetch_related(cls, rows: Iterable[tuple]) -> None:
+        City.prefetch((row[2],) for row in rows)
+
+    @classmethod
+    def _from_row(cls, key: tuple, row: tuple):
+        name, address, city_id = row
+        return cls.from_data(key[0], name, address, City.get(city_id))
+
     def __init__(self, id_: int):
         self.id = id_
         self.name, self.address, city_id = self._get_attr_from_db()[0]
-        self.city = City(city_id)
+        self.city = City.get(city_id)
+
+    @classmethod
+    def from_data(cls, id_: int, name, address, city):
+        """Создает объект из уже загруженных данных, не обращаясь к БД."""
+        obj = cls.__new__(cls)
+        obj.id = id_
+        obj.name, obj.address, obj.city = name, address, city
+        return obj
 
     def __repr__(self):
         return f"{__class__.__name__} {self.name!r}"
@@ -443,12 +1976,24 @@ class Stadium:
         return take_many_data("name, address, city_id", "Stadium", {"id": self.id})
 
 
-class Team:
+class Team(DBEntity):
+    __slots__ = ("name", "age")
+    table = "Team"
+
     def __init__(self, id_: int, age: int):
         self.id = id_
         self.name = self._get_name_from_db()
         self.age = age
 
+    @classmethod
+    def from_data(cls, id_: int, name, age):
+        """Создает объект из уже загруженных данных, не обращаясь к БД."""
+        obj = cls.__new__(cls)
+        obj.id = id_
+        obj.name = name
+        obj.age = age
+        return obj
+
     def __repr__(self):
         return f"{__class__.__name__} {self.name!r}"
 
@@ -456,11 +2001,22 @@ class Team:
         return take_one_data("name", "Team", {"id": self.id})
 
 
-class Category:
+class Category(DBEntity):
+    __slots__ = ("name",)
+    table = "Category"
+
     def __init__(self, id_: int):
         self.id = id_
         self.name = self._get_name_from_db()
 
+    @classmethod
+    def from_data(cls, id_: int, name):
+        """Создает объект из уже загруженных данных, не обращаясь к БД."""
+        obj = cls.__new__(cls)
+        obj.id = id_
+        obj.name = name
+        return obj
+
     def __repr__(self):
         return f"{__class__.__name__} {self.name!r}"
 
@@ -468,11 +2024,22 @@ class Category:
         return take_one_data("name", "Category", {"id": self.id})
 
 
-class City:
+class City(DBEntity):
+    __slots__ = ("name",)
+    table = "City"
+
     def __init__(self, id_: int):
         self.id = id_
         self.name = self._get_name_from_db()
 
+    @classmethod
+    def from_data(cls, id_: int, name):
+        """Создает объект из уже загруженных данных, не обращаясь к БД."""
+        obj = cls.__new__(cls)
+        obj.id = id_
+        obj.name = name
+        return obj
+
     def __repr__(self):
         return f"{__class__.__name__} {self.name!r}"
 
@@ -1,15 +1,21 @@
 import re
-from copy import deepcopy
+import datetime
 from abc import abstractmethod
 from math import ceil
+from concurrent.futures import Future
 
-from typing import Tuple
+from typing import Tuple, Optional, Sequence, Callable
 
 from kivy.uix.widget import WidgetException
 from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.layout import Layout
 from kivy.uix.checkbox import CheckBox
+from kivy.uix.image import Image
+from kivy.uix.behaviors import ButtonBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.utils import get_color_from_hex
 from kivy.properties import ObjectProperty
 from kivy.metrics import dp
 
@@ -20,7 +26,7 @@ from kivymd.uix.datatables import MDDataTable
 from kivymd.uix.dialog import MDDialog
 from kivymd.uix.button import MDFlatButton, MDRaisedButton, MDIconButton, MDRectangleFlatButton
 from kivymd.uix.textfield import MDTextField
-from kivymd.uix.label import MDLabel
+from kivymd.uix.label import MDLabel, MDIcon
 from kivymd.uix.snackbar import Snackbar
 from kivymd.uix.behaviors import TouchBehavior
 from kivy.uix.recycleview import RecycleView
@@ -34,6 +40,11 @@ def open_text_dialog(text):
     MDDialog(text=text).open()
 
 
+def open_db_error_dialog(error: BaseException):
+    """Сообщает, что запись в БД не выполнена."""
+    open_text_dialog(f"Database error: {error}")
+
+
 def open_snackbar(text):
     Snackbar(text=text).open()
 
@@ -74,6 +85,7 @@ class AppScreen(BoxLayout):
 
         self.add_game_dialog = ObjectProperty()
         self.games_screen = GameScreen(self.ids.games_box)
+        self.add_search_button(self.games_screen.toggle_search_panel)
 
     def add_float_button_callback(self) -> None:
         """Вызывается при нажатии на MDFloatingActionButton."""
@@ -85,6 +97,12 @@ class AppScreen(BoxLayout):
     def delete_back_button(self):
         self.ids.toolbar.left_action_items = []
 
+    def add_search_button(self, action):
+        self.ids.toolbar.right_action_items = [["magnify", lambda f: action()]]
+
+    def delete_search_button(self):
+        self.ids.toolbar.right_action_items = []
+
     def _back_button_click(self, action):
         action()
         self.delete_back_button()
@@ -92,24 +110,50 @@ class AppScreen(BoxLayout):
 
 
 class GameScreen:
+    # показывать игры в GamesList (RecycleView, для очень большого количества игр) вместо GamesTable
+    use_games_list = False
+
     def __init__(self, box):
         self.add_game_dialog = ObjectProperty()
 
         self.box = box
-        self.table_games = GamesTable()
+        self.table_games = GamesList() if self.use_games_list else GamesTable()
+        self.search_panel = GamesSearchPanel(self.table_games)
+        self.search_panel_shown = False
+        self.summary = GamesSummary()
 
-        # при первом включении необходимо показать контент
+        # пока загружается первая страница игр, показывается заставка, затем таблица
+        self.box.add_widget(Image(source="icons/loading.jpg"))
+        self.table_games.bind(on_games_loaded=self._show_first_page)
+
+    def _show_first_page(self, *_):
+        self.table_games.unbind(on_games_loaded=self._show_first_page)
         self.show_main_table()
 
     def show_info_game(self, showed_window):
         """Open windon with info about game."""
         # add button in toolbar
         APP.app_screen.add_back_button(self.show_main_table)
+        APP.app_screen.delete_search_button()
         APP.app_screen.ids.toolbar.title = "Info"
 
         self.box.clear_widgets()
         self.box.add_widget(showed_window)
 
+    def update_game(self, game: Game, data: dict, callback: Optional[Callable[[], None]] = None) -> None:
+        """Записывает в БД изменения игры game (столбцы Games). Только после успешной записи они применяются
+        к самой игре и к ее строке скрытой таблицы (без повторной загрузки игры) и вызывается callback.
+        Об ошибке записи сообщает open_db_error_dialog."""
+
+        def written(_):
+            game.apply_update(data)
+            self.table_games.mark_dirty(game)
+            if callback:
+                callback()
+
+        MainApp.DB.run_async(MainApp.DB.update, "Games", data, {"id": game.id_in_db},
+                             callback=written, error_callback=open_db_error_dialog)
+
     def open_dialog_add_game(self) -> None:
         """Открывает Dialog для добавления новой игры."""
         self.add_game_dialog = AddDialogWindow(type_="game")
@@ -119,132 +163,828 @@ class GameScreen:
         try:
             APP.app_screen.ids.toolbar.title = "Third Referee"
             APP.app_screen.delete_back_button()
+            APP.app_screen.add_search_button(self.toggle_search_panel)
         except AttributeError:
             pass
         self.box.clear_widgets()
-        self.table_games.update()
+        self.box.add_widget(self.summary)
+        if self.search_panel_shown:
+            self.box.add_widget(self.search_panel)
+        # видимая таблица обновляется сама после каждой записи в БД (GamesTable._on_db_write),
+        # изменения, сделанные пока она была скрыта, применяются сейчас
         self.box.add_widget(self.table_games)
+        self.table_games.reconcile()
+
+    def toggle_search_panel(self) -> None:
+        """Показывает или скрывает панель поиска игр. При скрытии фильтры сбрасываются."""
+        self.search_panel_shown = not self.search_panel_shown
+        if self.search_panel_shown:
+            # панель поиска - под строкой итогов
+            self.box.add_widget(self.search_panel, index=len(self.box.children) - 1)
+        else:
+            self.box.remove_widget(self.search_panel)
+            self.search_panel.clear()
+
+
+class GamesColumns:
+    """Показываемые в списке игр столбцы, общие для GamesTable и GamesList."""
+
+    cell_size = dp(25)
+    # ключи showed_data должны совпадать с именами атрибутов класса Game
+    data_dict = {"date": ('Date', dp(20)),
+                 "time": ('Time', dp(12)),
+                 "league": ('League',),
+                 "stadium": ('Stadium',),
+                 "team_home": ('Home team',),
+                 "team_guest": ('Guest team',),
+                 "referee_chief": ('Referee',),
+                 "status": ('St.', dp(7)),
+                 }
+
+    showed_data = ["date",
+                   "time",
+                   "stadium",
+                   "status",
+                   ]
+
+    def _set_column_name_and_size(self, data: str):
+        if data in self.data_dict:
+            data_dict = self.data_dict[data]
+            if len(data_dict) == 1:
+                name = self.data_dict.get(data)[0]
+                cell_size = self.cell_size
+            elif len(data_dict) == 2:
+                name, cell_size = self.data_dict.get(data)
+            else:
+                raise IndexError("len(item) in data_dict should be 1 or 2")
+
+        else:
+            name, cell_size = data, self.cell_size
+
+        return name, cell_size
+
+    def _return_name_data_for_table(self, game: dict) -> list:
+        """Преобразует игру из ConnDB.games_page_projection(showed_data) в табличные значения."""
+        returned_list_of_data = []
+
+        for name_data in self.showed_data:
+            if name_data in ["date", "time"]:
+                time_ = int(game["time"])
+                date = datetime.datetime(game["year"], game["month"], game["day"], time_ // 100, time_ % 100)
+                data_str = date.strftime("%d.%m.%Y" if name_data == "date" else "%H:%M")
+
+            elif name_data == "status":
+                data_str = Game.status_icn[Game._get_status(bool(game["game_passed"]), bool(game["pay_done"]))]
+
+            else:
+                # имена лиги, стадиона, команд и фамилии судей уже подставлены в запросе
+                data_str = game.get(name_data) or ""
+
+            returned_list_of_data.append(data_str)
+
+        return returned_list_of_data
 
+    def _game_projection(self, game: Game) -> Optional[dict]:
+        """Игра в виде ConnDB.games_page_projection(showed_data), собранная из уже загруженного объекта Game.
+        None, если показываемая связанная сущность не загружена (например, после Game.apply_update
+        изменился ее id): обращение к ней выполнило бы запрос к БД в главном потоке."""
+        if any(not getattr(Game, name).is_loaded(game) for name in self.showed_data if name in Game.relations):
+            return None
+
+        date = game.date
+        projection = {"id": game.id_in_db,
+                      "start_at": game.sort_key[0],
+                      "year": date.year, "month": date.month, "day": date.day,
+                      "time": date.hour * 100 + date.minute,
+                      "game_passed": game.game_passed,
+                      "pay_done": game.pay_done,
+                      }
+        for name in self.showed_data:
+            if name in ("league", "stadium", "team_home", "team_guest"):
+                entity = getattr(game, name)
+                projection[name] = entity.name if entity else None
+            elif name in Game.relations:
+                referee = getattr(game, name)
+                projection[name] = referee.second_name if referee else None
+            elif name in ("team_home_year", "team_guest_year", "payment"):
+                projection[name] = getattr(game, name)
+        return projection
 
-class GamesTable(MDDataTable, TouchBehavior):
+    @staticmethod
+    def sort_key(game: dict) -> tuple:
+        """Ключ игры из ConnDB.games_page_projection, как Game.sort_key."""
+        return game["start_at"], game["id"]
+
+    def open_game(self, id_: int):
+        """Загружает игру со всеми связанными сущностями и показывает информацию о ней."""
+        MainApp.DB.run_async(MainApp.DB.game, id_, callback=self._show_game)
+
+    @staticmethod
+    def _show_game(game_info: Optional[dict]):
+        if game_info:
+            info_dialog = InfoGameContent(type_="game", data_cls=Game(**game_info))
+            APP.app_screen.games_screen.show_info_game(info_dialog)
+
+
+class GamesTable(GamesColumns, MDDataTable, TouchBehavior):
     """Класс таблицы для отображения записанных в БД игр."""
 
     def __init__(self):
         self.info_dialog = ObjectProperty()
 
-        self.cell_size = dp(25)
-        # ключи showed_data должны совпадать с именами атрибутов класса Game
-        self.data_dict = {"date": ('Date', dp(20)),
-                          "time": ('Time', dp(12)),
-                          "league": ('League',),
-                          "stadium": ('Stadium',),
-                          "team_home": ('Home team',),
-                          "team_guest": ('Guest team',),
-                          "referee_chief": ('Referee',),
-                          "status": ('St.', dp(7)),
-                          }
-
-        self.showed_data = ["date",
-                            "time",
-                            "stadium",
-                            "status",
-                            ]
-
         # проверка, если в будущем будет несколько таблиц с заданными показываемыми значениями
         # значения showed_data должны состоять из ключей data_dict
         assert all(map(lambda data: data in Game.attribute,
                        self.showed_data)), f"showed_data might be in {Game.attribute}"
-        # копируем, чтобы при преобразовании имен данных для поиска в БД не изменять показываемые в таблицке дынные
-        self.data_for_db = deepcopy(self.showed_data)
 
         self.elevation = 100
         self.rows_num = 10
         self.use_pagination = True
         self.check = False
-        self.column_data = list(map(lambda data: self._set_column_name_and_size(data), self.showed_data))
-
-        self.row_data = self._take_games()
+        # направление сортировки по кнопке в заголовке каждого столбца (см. _sort_by_header)
+        self._sort_descending = {}
+        self.column_data = [self._column_with_sort(data) for data in self.showed_data]
+
+        # ключи (start_at, id) загруженных игр в порядке таблицы; сами игры загружаются только при открытии
+        self.games_keys = []
+        # ключи загруженных игр по id в БД, чтобы изменение одной игры применялось только к ее строке
+        self.games_by_id = {}
+        # сортировка и фильтры игр в памяти (аргументы GamesStore.select, см. sort_games и filter_games)
+        self.store_query = {}
+        # id игр в порядке store_query (None - все игры в порядке ConnDB.games_order)
+        self.store_ids = None
+        # фильтры поиска игр в БД (см. ConnDB.games_search и search_games)
+        self.search_filters = {}
+        self.all_games_loaded = False
+        self.games_count = 0
+        # игры загружаются в потоке DBWorker, устаревшие результаты (после нового update) отбрасываются
+        self._loading_games = False
+        self._load_generation = 0
+
+        # после первой страницы остальные игры догружаются частями по stream_chunk (см. _stream_games)
+        self.stream_chunk = 50
+        self._stream_event = Clock.create_trigger(self._stream_games, 0.1, interval=True)
+
+        # изменения игр, пока таблица скрыта (см. mark_dirty и reconcile): id игры - уже измененный объект Game
+        # или None, если игру нужно загрузить из БД; _dirty_all - таблицу нужно загрузить заново
+        self._dirty_games = {}
+        self._dirty_all = False
+
+        self.row_data = []
         super(GamesTable, self).__init__()
+        self.register_event_type("on_games_loaded")
 
         self.count_cell_in_row = len(self.column_data)
 
+        # страницы подгружаются из БД по мере перелистывания таблицы
+        self.table_data.bind(_rows_number=self._load_pages_for_current,
+                             rows_num=self._load_pages_for_current)
+        label = self.pagination.ids.label_rows_per_page
+        label.bind(text=self._show_games_count)
+        self._show_games_count(label, label.text)
+
+        ConnDB.add_write_listener(self._on_db_write)
+        self.update()
+
     def on_row_press(self, instance_cell_row):
-        if self.list_of_games:  # без этой проверки при отсутствии игр вылетает ошибка
-            # строка, в которой находится нажатая клетка
-            row_cell = instance_cell_row.index // self.count_cell_in_row
+        if self.games_keys:  # без этой проверки при отсутствии игр вылетает ошибка
+            # строка, в которой находится нажатая клетка (с учетом предыдущих страниц)
+            row_cell = self.table_data._rows_number * self.table_data.rows_num \
+                       + instance_cell_row.index // self.count_cell_in_row
 
-            # игра, записанная в данной строке
-            game = self.list_of_games[row_cell]
-            # self.info_dialog = InfoDialogWindow(type_="game", data_cls=game)
-            info_dialog = InfoGameContent(type_="game", data_cls=game)
-            # self.info_dialog.open()
+            # игра, записанная в данной строке, загружается целиком только сейчас
+            _, id_ = self.games_keys[row_cell]
+            self.open_game(id_)
 
-            APP.app_screen.games_screen.show_info_game(info_dialog)
+    def on_games_loaded(self, *_):
+        """Вызывается, когда показаны первые страницы игр после update."""
 
-    def _set_column_name_and_size(self, data: str):
-        if data in self.data_dict:
-            data_dict = self.data_dict[data]
-            if len(data_dict) == 1:
-                name = self.data_dict.get(data)[0]
-                cell_size = self.cell_size
-            elif len(data_dict) == 2:
-                name, cell_size = self.data_dict.get(data)
+    def update(self):
+        """Обновляет таблицу. Первые страницы игр загружаются в потоке DBWorker,
+        загружается на одну страницу больше показываемой, чтобы было известно, есть ли следующая страница.
+        Остальные игры догружаются в фоне (_stream_games)."""
+        self._stream_event.cancel()
+        self._load_generation += 1
+        self._loading_games = True
+        generation = self._load_generation
+
+        if self.store_query:
+            MainApp.DB.run_async(self._take_store_games, dict(self.store_query), self.rows_num * 2,
+                                 filters=dict(self.search_filters),
+                                 callback=lambda result: self._set_store_games(generation, result))
+        else:
+            self.store_ids = None
+            MainApp.DB.run_async(self._take_games, None, self.rows_num * 2, with_count=True,
+                                 filters=dict(self.search_filters),
+                                 callback=lambda result: self._set_games(generation, result))
+
+    def search_games(self, filters: dict):
+        """Показывает только игры, подходящие под filters (см. ConnDB.games_search). Игры ищутся в БД
+        постранично, как и без фильтров. Пустые filters возвращают показ всех игр.
+        Сортировка sort_games сохраняется: найденные игры упорядочивает GamesStore (см. _take_store_games)."""
+        filters = {key: value for key, value in filters.items() if value not in (None, "")}
+        if filters == self.search_filters:
+            return
+
+        self.search_filters = filters
+        self.update()
+
+    def _column_with_sort(self, data: str) -> tuple:
+        """Столбец MDDataTable. У столбцов из GamesStore.sort_columns в заголовке есть кнопка сортировки
+        (у первого столбца MDDataTable ее не показывает)."""
+        column = self._set_column_name_and_size(data)
+        if data in GamesStore.sort_columns:
+            column += (lambda _, data_=data: self._sort_by_header(data_),)
+        return column
+
+    def _sort_by_header(self, column: str) -> tuple:
+        """Сортирует игры по нажатию кнопки в заголовке столбца, каждое нажатие меняет направление
+        (как стрелка на кнопке). Игры сортирует GamesStore, поэтому MDDataTable получает пустой результат
+        и сама строки не сортирует."""
+        descending = self._sort_descending[column] = not self._sort_descending.get(column, False)
+        self.sort_games(column, descending)
+        return [], []
+
+    def sort_games(self, column: str, descending: bool = False):
+        """Сортирует игры по атрибуту Game column (см. GamesStore.sort_columns) в памяти, без запроса к БД.
+        Из БД загружаются только показываемые строки. Фильтры поиска search_games сохраняются."""
+        self.store_query.update(order_by=column, descending=descending)
+        self.update()
+
+    def filter_games(self, **filters):
+        """Оставляет в таблице только игры, подходящие под filters (аргументы GamesStore.select),
+        сохраняя заданную sort_games сортировку и фильтры поиска search_games."""
+        order = {key: self.store_query[key] for key in ("order_by", "descending") if key in self.store_query}
+        filters = {key: value for key, value in filters.items() if value is not None}
+        self.store_query = {**order, **filters}
+        self.update()
+
+    def reset_store_query(self):
+        """Возвращает таблицу к показу всех игр в порядке ConnDB.games_order."""
+        self.store_query = {}
+        self.update()
+
+    def _take_games(self, after: Optional[tuple], count: int, with_count: bool = False,
+                    filters: Optional[dict] = None) -> tuple:
+        """Загружает из БД count игр после игры с ключом after (выполняется в потоке DBWorker).
+        Если заданы filters, загружаются только подходящие под них игры (см. ConnDB.games_search).
+
+            Return:
+                games_keys(list) - ключи загруженных игр.
+                table_data(list) - преобразованные в табличные значения данные игр.
+                games_count(int) - количество всех игр в БД (если with_count)."""
+
+        with MainApp.DB.stats.measure("GamesTable.update" if with_count else "GamesTable page"):
+            if filters:
+                games = MainApp.DB.games_search(self.showed_data, filters, after, count)
+                games_count = MainApp.DB.games_search_count(filters) if with_count else None
             else:
-                raise IndexError("len(item) in data_dict should be 1 or 2")
+                games = MainApp.DB.games_page_projection(self.showed_data, after, count)
+                games_count = MainApp.DB.games_count if with_count else None
+            games_keys = [self.sort_key(game) for game in games]
+            table_data = [self._return_name_data_for_table(game) for game in games]
+
+        return games_keys, table_data, games_count
 
+    def _take_store_games(self, query: dict, count: int, filters: Optional[dict] = None) -> tuple:
+        """Выбирает игры в GamesStore и загружает первые count из них (выполняется в потоке DBWorker).
+        Если заданы filters, выбираются только игры, найденные по ним в БД (см. ConnDB.games_search_ids).
+
+            Return:
+                ids(list) - id всех выбранных игр в порядке query.
+                games_keys, table_data - как в _take_games.
+                games_count(int) - количество выбранных игр."""
+
+        with MainApp.DB.stats.measure("GamesTable store"):
+            if filters:
+                query = {**query, "ids": MainApp.DB.games_search_ids(filters)}
+            ids = MainApp.DB.games_store.select(**query)
+            games_keys, table_data, _ = self._take_games_by_ids(ids[:count])
+        return ids, games_keys, table_data, len(ids)
+
+    def _take_games_by_ids(self, ids: list) -> tuple:
+        """Загружает из БД игры с заданными id в порядке ids (выполняется в потоке DBWorker)."""
+        games = MainApp.DB.games_projection_by_ids(self.showed_data, ids)
+        games_keys = [self.sort_key(game) for game in games]
+        table_data = [self._return_name_data_for_table(game) for game in games]
+        return games_keys, table_data, None
+
+    def _set_store_games(self, generation: int, result: tuple):
+        if generation != self._load_generation:
+            return
+
+        self.store_ids, *result = result
+        self._set_games(generation, tuple(result))
+
+    def _set_games(self, generation: int, result: tuple):
+        """Показывает загруженные update первые страницы игр."""
+        if generation != self._load_generation:
+            return
+
+        games_keys, row_data, self.games_count = result
+        self.games_keys = games_keys
+        self.games_by_id = {key[1]: key for key in games_keys}
+        self.all_games_loaded = len(games_keys) < self.rows_num * 2
+        self._loading_games = False
+
+        if row_data == self.row_data:
+            # при равных данных row_data не вызывает обновления таблицы, а догруженные страницы нужно сбросить
+            self.update_row_data(self, row_data)
         else:
-            name, cell_size = data, self.cell_size
+            self.row_data = row_data
+
+        self.dispatch("on_games_loaded")
+        # в фоне догружается только полный список игр; результаты поиска и GamesStore
+        # догружаются постранично при перелистывании (_load_pages_for_current)
+        if not self.all_games_loaded and not self.search_filters and self.store_ids is None:
+            self._stream_event()
+
+    def _load_pages_for_current(self, *_):
+        """Догружает игры так, чтобы после текущей страницы таблицы была загружена еще одна."""
+        table_data = self.table_data
+        need_rows = (table_data._rows_number + 2) * table_data.rows_num
+        if self._loading_games or self.all_games_loaded or len(self.games_keys) >= need_rows:
+            return
 
-        return name, cell_size
+        self._load_games(need_rows - len(self.games_keys))
 
-    def update(self):
-        """Обновляет таблицу"""
-        self.row_data = self._take_games()
+    def _stream_games(self, _=None):
+        """Догружает в фоне следующую часть игр (вызывается Clock, пока загружены не все игры)."""
+        if self.all_games_loaded:
+            return False
+        if not self._loading_games:
+            self._load_games(self.stream_chunk)
+
+    def _load_games(self, count: int):
+        """Загружает в потоке DBWorker count игр после последней загруженной и добавляет их в таблицу."""
+        self._loading_games = True
+        generation = self._load_generation
+        callback = lambda result: self._add_games(generation, count, result)
+
+        if self.store_ids is not None:
+            start = len(self.games_keys)
+            MainApp.DB.run_async(self._take_games_by_ids, self.store_ids[start:start + count], callback=callback)
+        else:
+            after = self.games_keys[-1] if self.games_keys else None
+            MainApp.DB.run_async(self._take_games, after, count, filters=dict(self.search_filters),
+                                 callback=callback)
 
-    def _take_games(self) -> list:
-        """Возвращает преобразованные в табличные значения данные из БД."""
-        games = MainApp.DB.games
-        return_table_data = []
-        self.list_of_games = []
+    def _add_games(self, generation: int, count: int, result: tuple):
+        """Добавляет догруженные игры в конец таблицы без сброса текущей страницы."""
+        if generation != self._load_generation:
+            return
 
-        for game_info in games:
-            game = Game(**game_info)
-            return_table_data.append(self._return_name_data_for_table(game))
-            self.list_of_games.append(game)
+        games_keys, rows, _ = result
+        self._loading_games = False
+        self.all_games_loaded = len(games_keys) < count
+
+        # игры, уже добавленные _patch_game, не дублируем
+        new = [inx for inx, (_, id_) in enumerate(games_keys) if id_ not in self.games_by_id]
+        games_keys = [games_keys[inx] for inx in new]
+        rows = [rows[inx] for inx in new]
+        self.games_keys.extend(games_keys)
+        self.games_by_id.update((key[1], key) for key in games_keys)
+
+        if rows:
+            table_data = self.table_data
+            table_data.row_data.extend(rows)
+            table_data._row_data_parts = list(
+                table_data._split_list_into_equal_parts(table_data.row_data, table_data.rows_num))
+            if table_data._to_value < len(table_data.row_data):
+                self.pagination.ids.button_forward.disabled = False
+
+        # пока шла загрузка, страницу могли перелистнуть дальше
+        self._load_pages_for_current()
+
+    def _on_db_write(self, table: str, action: str, data: dict, conditions: dict):
+        """Обновляет таблицу после записи в БД (вызывается в потоке, выполнившем запись).
+        Если изменилась одна игра, из БД загружается и перерисовывается только она."""
+        table = table.lower()
+        if table == "games" and conditions.keys() == {"id"}:
+            id_ = conditions["id"]
+            Clock.schedule_once(lambda _: self._game_changed(id_))
+        elif table == "games" or action != "insert":
+            # изменено сразу несколько игр или связанные с играми имена (стадионов, команд, судей...)
+            Clock.schedule_once(lambda _: self._table_changed())
+
+    def _game_changed(self, id_: int):
+        if self.store_query or self.search_filters:
+            # при сортировке и фильтрах таблица выбирается заново (для store_query - из уже обновленного GamesStore)
+            self._table_changed()
+        elif self.parent is None:
+            # запись в БД важнее игры, измененной в памяти раньше (например, игру удалили после правки):
+            # строка будет загружена из БД, если после записи игру снова не отметят mark_dirty
+            self._dirty_games[id_] = None
+        else:
+            MainApp.DB.run_async(self._take_game, id_, callback=self._patch_game)
 
-        return return_table_data
+    def _table_changed(self):
+        if self.parent is None:
+            self._dirty_all = True
+        else:
+            self.update()
+
+    def mark_dirty(self, game: Game):
+        """Отмечает игру, уже измененную в памяти (Game.apply_update), пока таблица скрыта.
+        Ее строка будет собрана из самого объекта при reconcile, без загрузки из БД
+        (если изменились показываемые связанные сущности - загружена в потоке DBWorker)."""
+        self._dirty_games[game.id_in_db] = game
+
+    def reconcile(self):
+        """Применяет изменения игр, накопленные, пока таблица была скрыта: каждая измененная игра
+        перерисовывается один раз, сколько бы раз ее ни изменяли."""
+        dirty_games, self._dirty_games = self._dirty_games, {}
+        if self._dirty_all or ((self.store_query or self.search_filters) and dirty_games):
+            self._dirty_all = False
+            self.update()
+            return
 
-    def _return_name_data_for_table(self, game):
-        returned_list_of_data = []
+        for id_, game in dirty_games.items():
+            projection = self._game_projection(game) if game is not None else None
+            if projection is None:
+                MainApp.DB.run_async(self._take_game, id_, callback=self._patch_game)
+            else:
+                self._patch_game((id_, self.sort_key(projection), self._return_name_data_for_table(projection),
+                                  self.games_count))
 
-        for name_data in self.showed_data:
-            if name_data == "date":
-                data_str = game.date.strftime("%d.%m.%Y")
-            elif name_data == "time":
-                data_str = game.date.strftime("%H:%M")
+    def _take_game(self, id_: int) -> tuple:
+        """Загружает из БД одну игру (выполняется в потоке DBWorker).
 
-            elif name_data in ["league", "stadium"]:
-                ls = getattr(game, name_data)
-                data_str = take_one_data("name", name_data.title(), {"id": ls.id}) if ls else ""
+            Return:
+                id_(int) - id игры.
+                key(tuple) - ключ игры или None, если игра удалена.
+                row(list) - табличные значения игры или None.
+                games_count(int) - количество всех игр в БД."""
+
+        with MainApp.DB.stats.measure("GamesTable patch"):
+            game = MainApp.DB.game_projection(self.showed_data, id_)
+            key = self.sort_key(game) if game else None
+            row = self._return_name_data_for_table(game) if game else None
+            return id_, key, row, MainApp.DB.games_count
+
+    def _patch_game(self, result: tuple):
+        """Применяет к загруженным строкам изменение одной игры: удаляет, добавляет или перемещает ее строку."""
+        id_, key, row, self.games_count = result
+        rows = self.table_data.row_data
+        showed_page = self._current_page()
+
+        old_key = self.games_by_id.pop(id_, None)
+        if old_key is not None:
+            inx = self.games_keys.index(old_key)
+            del self.games_keys[inx]
+            del rows[inx]
+
+        if key is not None:
+            inx = next((inx for inx, k in enumerate(self.games_keys) if k < key), len(self.games_keys))
+            # игра старше всех загруженных появится при догрузке страниц
+            if inx < len(self.games_keys) or self.all_games_loaded:
+                self.games_keys.insert(inx, key)
+                rows.insert(inx, row)
+                self.games_by_id[id_] = key
+
+        self._refresh_pages(showed_page)
+
+    def _current_page(self) -> list:
+        """Строки текущей страницы таблицы."""
+        table_data = self.table_data
+        parts = table_data._row_data_parts
+        return list(parts[table_data._rows_number]) if table_data._rows_number < len(parts) else []
+
+    def _refresh_pages(self, showed_page: list):
+        """Пересчитывает страницы после изменения загруженных строк. Таблица перерисовывается,
+        только если изменились строки текущей страницы.
+
+            Parameters:
+                showed_page(list) - строки текущей страницы до изменения."""
+
+        table_data = self.table_data
+        table_data._row_data_parts = list(
+            table_data._split_list_into_equal_parts(table_data.row_data, table_data.rows_num))
+        if table_data._rows_number and table_data._rows_number >= len(table_data._row_data_parts):
+            # удалена последняя строка последней страницы
+            table_data._rows_number = max(len(table_data._row_data_parts) - 1, 0)
+
+        page = self._current_page()
+        if page != showed_page:
+            table_data.set_row_data()
+
+        table_data._current_value = table_data._rows_number * table_data.rows_num + 1
+        table_data._to_value = table_data._current_value + len(page) - 1
+        pagination = self.pagination.ids
+        pagination.button_forward.disabled = table_data._to_value >= len(table_data.row_data)
+        pagination.button_back.disabled = table_data._rows_number == 0
+        pagination.label_rows_per_page.text = \
+            f"{table_data._current_value}-{table_data._to_value} of {self.games_count}"
+
+        self._load_pages_for_current()
+
+    def _show_games_count(self, label, text):
+        """Показывает в подписи пагинации общее количество игр в БД, а не количество загруженных."""
+        head, separator, _ = text.rpartition(" of ")
+        if separator and text != f"{head} of {self.games_count}":
+            label.text = f"{head} of {self.games_count}"
+
+
+class GameRow(RecycleDataViewBehavior, ButtonBehavior, MDBoxLayout):
+    """Строка GamesList. RecycleView создает столько строк, сколько помещается на экране,
+    и при прокрутке только заполняет их данными следующих игр."""
 
-            elif name_data in ["referee_chief", "referee_first", "referee_second", "referee_reserve"]:
-                referee = getattr(game, name_data, None)
-                data_str = referee.second_name if referee else ""
+    def __init__(self, **kwargs):
+        super(GameRow, self).__init__(**kwargs)
+        self.id_in_db = None
+        self.games_list = None
+        self.cells = []
+
+    def refresh_view_attrs(self, rv, index, data):
+        """Заполняет строку данными игры (словарем из GamesList.data)."""
+        self.id_in_db = data["id_in_db"]
+        self.games_list = data["games_list"]
+
+        if not self.cells:
+            self._add_cells(data["row"])
+
+        for cell, value in zip(self.cells, data["row"]):
+            if isinstance(cell, MDIcon):
+                cell.icon, color, _ = value
+                cell.text_color = get_color_from_hex(color)
+            else:
+                cell.text = str(value)
 
-            elif name_data in ["team_home", "team_guest"]:
-                team = getattr(game, name_data)
-                data_str = take_one_data("name", "Team", {"id": team.id}) if team else ""
+    def _add_cells(self, row: list):
+        """Создает ячейки строки: для статуса иконку, для остальных столбцов текст."""
+        for value, size_hint_x in zip(row, self.games_list.column_size_hints):
+            if isinstance(value, (tuple, list)):
+                cell = MDIcon(theme_text_color="Custom", halign="center", size_hint_x=size_hint_x)
+            else:
+                cell = MDLabel(shorten=True, size_hint_x=size_hint_x)
+            self.cells.append(cell)
+            self.add_widget(cell)
 
-            elif name_data == "status":
-                data_str = game.status
+    def on_release(self):
+        if self.games_list:
+            self.games_list.open_game(self.id_in_db)
+
+
+class GamesList(GamesColumns, MDBoxLayout):
+    """Список игр на RecycleView для большого количества игр. В отличие от GamesTable хранит только
+    словари с показываемыми значениями, а виджеты строк переиспользуются при прокрутке.
+    Следующая страница игр загружается, когда список прокручен почти до конца."""
 
+    page_size = 50
+    row_height = dp(48)
+
+    def __init__(self):
+        super(GamesList, self).__init__(orientation="vertical")
+
+        self.column_data = list(map(lambda data: self._set_column_name_and_size(data), self.showed_data))
+        columns_width = sum(size for _, size in self.column_data)
+        self.column_size_hints = [size / columns_width for _, size in self.column_data]
+
+        header = MDBoxLayout(size_hint_y=None, height=self.row_height)
+        for (name, _), size_hint_x in zip(self.column_data, self.column_size_hints):
+            header.add_widget(MDLabel(text=name, bold=True, shorten=True, size_hint_x=size_hint_x))
+        self.add_widget(header)
+
+        layout = RecycleBoxLayout(orientation="vertical",
+                                  size_hint_y=None,
+                                  default_size=(None, self.row_height),
+                                  default_size_hint=(1, None))
+        layout.bind(minimum_height=layout.setter("height"))
+        self.recycle_view = RecycleView()
+        self.recycle_view.add_widget(layout)
+        # viewclass передается layout manager, поэтому задается после его добавления
+        self.recycle_view.viewclass = GameRow
+        self.recycle_view.bind(scroll_y=self._load_next_page)
+        self.add_widget(self.recycle_view)
+
+        self.all_games_loaded = False
+        self._loading_games = False
+        self._load_generation = 0
+        # фильтры поиска игр в БД (см. ConnDB.games_search)
+        self.search_filters = {}
+        # игры изменились, пока список был скрыт (см. reconcile)
+        self._dirty = False
+
+        self.register_event_type("on_games_loaded")
+        ConnDB.add_write_listener(self._on_db_write)
+        self.update()
+
+    def on_games_loaded(self, *_):
+        """Вызывается, когда показана первая страница игр после update."""
+
+    def search_games(self, filters: dict):
+        """Показывает только игры, подходящие под filters (см. ConnDB.games_search)."""
+        filters = {key: value for key, value in filters.items() if value not in (None, "")}
+        if filters != self.search_filters:
+            self.search_filters = filters
+            self.recycle_view.data = []
+            self.update()
+
+    def update(self):
+        """Заново загружает из БД все показанные в списке игры."""
+        self._load_generation += 1
+        self._loading_games = True
+        generation = self._load_generation
+        count = max(self.page_size, len(self.recycle_view.data))
+
+        MainApp.DB.run_async(self._take_rows, None, count, dict(self.search_filters),
+                             callback=lambda rows: self._set_rows(generation, count, rows))
+
+    def _take_rows(self, after: Optional[tuple], count: int, filters: dict) -> list:
+        """Загружает из БД count игр после игры с ключом after, подходящих под filters
+        (выполняется в потоке DBWorker).
+
+            Return:
+                rows(list) - словари для строк GameRow."""
+
+        with MainApp.DB.stats.measure("GamesList page"):
+            rows = []
+            if filters:
+                games = MainApp.DB.games_search(self.showed_data, filters, after, count)
             else:
-                game_attr = getattr(game, name_data, None)
-                data_str = game_attr if game_attr else ""
+                games = MainApp.DB.games_page_projection(self.showed_data, after, count)
+            for game in games:
+                rows.append({"row": self._return_name_data_for_table(game),
+                             "id_in_db": game["id"],
+                             "sort_key": self.sort_key(game),
+                             "games_list": self})
+            return rows
+
+    def _set_rows(self, generation: int, count: int, rows: list):
+        if generation != self._load_generation:
+            return
 
-            returned_list_of_data.append(data_str)
+        self._loading_games = False
+        self.all_games_loaded = len(rows) < count
+        self.recycle_view.data = rows
+        self.dispatch("on_games_loaded")
 
-        return returned_list_of_data
+    def _load_next_page(self, _, scroll_y: float):
+        """Догружает следующую страницу игр, когда список прокручен почти до конца."""
+        data = self.recycle_view.data
+        if scroll_y > 0.1 or self._loading_games or self.all_games_loaded or not data:
+            return
+
+        self._loading_games = True
+        generation = self._load_generation
+        MainApp.DB.run_async(self._take_rows, data[-1]["sort_key"], self.page_size, dict(self.search_filters),
+                             callback=lambda rows: self._add_rows(generation, rows))
+
+    def _add_rows(self, generation: int, rows: list):
+        if generation != self._load_generation:
+            return
+
+        self._loading_games = False
+        self.all_games_loaded = len(rows) < self.page_size
+        self.recycle_view.data.extend(rows)
+
+    def _on_db_write(self, table: str, action: str, data: dict, conditions: dict):
+        """Обновляет список после записи в БД (вызывается в потоке, выполнившем запись)."""
+        if table.lower() == "games" or action != "insert":
+            Clock.schedule_once(lambda _: self._list_changed())
+
+    def _list_changed(self):
+        # скрытый список обновляется, только когда его снова покажут (reconcile)
+        if self.parent is None:
+            self._dirty = True
+        else:
+            self.update()
+
+    def mark_dirty(self, game: Game):
+        """Отмечает, что игра изменена, пока список скрыт."""
+        self._dirty = True
+
+    def reconcile(self):
+        """Обновляет список, если игры изменились, пока он был скрыт."""
+        if self._dirty:
+            self._dirty = False
+            self.update()
+
+
+class GamesSummary(MDBoxLayout):
+    """Строка итогов над таблицей: количество игр каждого статуса и сумма еще не полученной оплаты
+    за прошедшие игры. Счетчики берутся из ConnDB.games_summary после каждого изменения игр."""
+
+    def __init__(self):
+        super(GamesSummary, self).__init__(orientation="horizontal",
+                                           size_hint_y=None,
+                                           height=dp(40),
+                                           padding=[dp(10), 0])
+
+        self.counts = {}
+        for status, (icon, color, _) in Game.status_icn.items():
+            self.add_widget(MDIcon(icon=icon, theme_text_color="Custom", text_color=get_color_from_hex(color),
+                                   size_hint_x=None, width=dp(30)))
+            self.counts[status] = MDLabel(text="0", size_hint_x=None, width=dp(50))
+            self.add_widget(self.counts[status])
+        self.outstanding = MDLabel(halign="right")
+        self.add_widget(self.outstanding)
+
+        ConnDB.add_write_listener(self._on_db_write)
+        self.update()
+
+    def update(self):
+        MainApp.DB.run_async(MainApp.DB.games_summary, callback=self._show)
+
+    def _show(self, summary: dict):
+        for status, (games, _) in summary.items():
+            self.counts[status].text = str(games)
+        # оплата за прошедшие, но еще не оплаченные игры
+        self.outstanding.text = f"To pay: {summary['passed'][1]}"
+
+    def _on_db_write(self, table: str, action: str, data: dict, conditions: dict):
+        if table.lower() == "games":
+            Clock.schedule_once(lambda _: self.update())
+
+
+class GamesSearchPanel(MDBoxLayout):
+    """Панель поиска игр над таблицей: период, стадион, лига, команда, судья и статус.
+    Поиск выполняется в БД (GamesTable.search_games) после паузы в наборе текста."""
+
+    # задержка поиска после изменения фильтра, сек.
+    search_delay = 0.3
+    date_pattern = re.compile(r"^\s*(\d{1,2})\.(\d{1,2})\.(\d{4})\s*$")
+
+    def __init__(self, table):
+        super(GamesSearchPanel, self).__init__(orientation="vertical",
+                                               size_hint_y=None,
+                                               padding=[dp(10), 0],
+                                               spacing=dp(5))
+        self.bind(minimum_height=self.setter("height"))
+
+        self.table = table
+        self.status = None
+        self._search_trigger = Clock.create_trigger(self._search, self.search_delay)
+
+        self.fields = {}
+        for row in [(("date_from", "From (DD.MM.YYYY)"), ("date_to", "To (DD.MM.YYYY)")),
+                    (("stadium", "Stadium"), ("league", "League")),
+                    (("team", "Team"), ("referee", "Referee"))]:
+            box = MDBoxLayout(orientation="horizontal", size_hint_y=None, height=dp(48), spacing=dp(10))
+            for key, hint in row:
+                field = MDTextField(hint_text=hint)
+                field.bind(text=lambda *_: self._schedule_search())
+                self.fields[key] = field
+                box.add_widget(field)
+            self.add_widget(box)
+
+        status_box = MDBoxLayout(orientation="horizontal", size_hint_y=None, height=dp(48))
+        self.status_buttons = {}
+        for status, (icon, color, _) in Game.status_icn.items():
+            button = MDIconButton(icon=icon, theme_text_color="Custom", text_color=get_color_from_hex(color),
+                                  on_release=lambda _, status_=status: self.set_status(status_))
+            self.status_buttons[status] = button
+            status_box.add_widget(button)
+        status_box.add_widget(MDLabel())
+        status_box.add_widget(MDIconButton(icon="close", on_release=lambda _: self.clear()))
+        self.add_widget(status_box)
+        self._show_status()
+
+    def set_status(self, status: str):
+        """Выбирает статус игр для поиска, повторное нажатие снимает фильтр статуса."""
+        self.status = None if status == self.status else status
+        self._show_status()
+        self._schedule_search()
+
+    def clear(self):
+        """Сбрасывает все фильтры."""
+        for field in self.fields.values():
+            field.text = ""
+        self.status = None
+        self._show_status()
+        self._schedule_search()
+
+    def filters(self) -> dict:
+        """Фильтры для ConnDB.games_search. Неполностью введенные даты не учитываются."""
+        filters = {key: field.text.strip() for key, field in self.fields.items()}
+        for key in ("date_from", "date_to"):
+            filters[key] = self._date(filters[key])
+        filters["status"] = self.status
+        return filters
+
+    def _date(self, text: str) -> Optional[datetime.date]:
+        match = self.date_pattern.match(text)
+        if not match:
+            return None
+        day, month, year = map(int, match.groups())
+        try:
+            return datetime.date(year, month, day)
+        except ValueError:
+            return None
+
+    def _show_status(self):
+        # невыбранные статусы показываются полупрозрачными
+        for status, button in self.status_buttons.items():
+            button.opacity = 1 if self.status in (None, status) else 0.4
+
+    def _schedule_search(self):
+        """Откладывает поиск на search_delay: каждое изменение фильтра переносит его,
+        поэтому при наборе имени поиск выполняется один раз - для последнего текста."""
+        self._search_trigger.cancel()
+        self._search_trigger()
+
+    def _search(self, _=None):
+        self.table.search_games(self.filters())
 
 
 class DialogWindow(MDDialog):
@@ -544,9 +1284,7 @@ class InfoDialogContent(DialogContent):
         caller.parent.parent.click_add()
 
     def bool_update_db(self, checkbox, value):
-        data = 1 if value else 0
-        MainApp.DB.update('Games', {checkbox.data_key: data}, {'id': self.game.id_in_db})
-        APP.app_screen.games_screen.table_games.update()
+        APP.app_screen.games_screen.update_game(self.game, {checkbox.data_key: 1 if value else 0})
 
     def show_year(self, value):
         if value:
@@ -568,8 +1306,9 @@ class InfoDialogContent(DialogContent):
         Alert("Are you sure?", self.delete_game).open()
 
     def delete_game(self, _=None):
-        MainApp.DB.delete('Games', {'id': self.game.id_in_db})
-        APP.app_screen.games_screen.show_main_table()
+        MainApp.DB.run_async(MainApp.DB.delete, 'Games', {'id': self.game.id_in_db},
+                             callback=lambda _: APP.app_screen.games_screen.show_main_table(),
+                             error_callback=open_db_error_dialog)
 
     def _reformat_items(self, box):
         self._clear_empty_box(box)
@@ -613,9 +1352,10 @@ class AddDialogContent(DialogContent):
 
     def update_db(self) -> bool:
         """Обрабатывает полученные из полей данные и отправляет на обновление БД.
+        Окно закрывается после успешной записи, об ошибке записи сообщает open_db_error_dialog.
 
             Return:
-                success(bool) - успех добавления в БД."""
+                success(bool) - данные корректны и отправлены на запись в БД."""
 
         children = self.children_
 
@@ -643,21 +1383,24 @@ class AddDialogContent(DialogContent):
             open_text_dialog(f"The fields:\n{not_filled}\n is not filled on")
             return False
 
-        MainApp.DB.insert(self.data_table, data)
+        # об успехе сообщается только после того, как запись выполнена;
+        # при ошибке окно остается открытым, чтобы данные можно было исправить
+        MainApp.DB.run_async(MainApp.DB.insert, self.data_table, data,
+                             callback=lambda _: self._show_added(caller_field_text.strip()),
+                             error_callback=open_db_error_dialog)
+        return True
 
+    def _show_added(self, caller_field_text: str):
         # self.parent - BoxLayout, self.parent.parent - MDCard, self.parent.parent.parent - DialogWindow
         self.parent.parent.parent.dismiss()
 
         if not self.caller_:
             open_text_dialog("Successfully added")
-            APP.app_screen.games_screen.table_games.update()
 
         else:
-            self.caller_.text = caller_field_text.strip()
+            self.caller_.text = caller_field_text
             open_snackbar(f"{self.caller_.hint_text.title()} {self.caller_.text} successfully added")
 
-        return True
-
     def on_tf_text_validate(self, caller):
         """Устанавливает фокус на следующем виджете, если он не заполнен и виден на экране."""
         widgets = self.children_
@@ -922,8 +1665,9 @@ class DropMenu(MDDropdownMenu):
     def __repr__(self):
         return f"{__class__.__name__} of {self.name_!r}"
 
-    def set_items(self, text_list, list_items: list, added_item=None):
-        """Добавляет items в DropMenu."""
+    def set_items(self, text_list, list_items: list, added_item=None, similar_items: Sequence[str] = ()):
+        """Добавляет items в DropMenu. Если подходящих items нет, первым предлагается добавить added_item,
+        а за ним показываются похожие имена similar_items (найденные нечетким поиском)."""
         if list_items:
             self.items = [{"text": f"{item}",
                            "viewclass": "OneLineListItem",
@@ -932,7 +1676,11 @@ class DropMenu(MDDropdownMenu):
         else:
             self.items = [{"text": f'Add "{added_item}" in base',
                            "viewclass": "OneLineListItem",
-                           "on_release": lambda: text_list.drop_menu_add_data()}]
+                           "on_release": lambda: text_list.drop_menu_add_data()}] + \
+                         [{"text": f"{item}",
+                           "viewclass": "OneLineListItem",
+                           "on_release": lambda x=f"{item}": text_list.add_item_in_text_input(x),
+                           } for item in similar_items]
 
     def update(self):
         self.set_menu_properties()
@@ -1010,13 +1758,23 @@ class TFWithDrop(TextField):
         assert hasattr(self, "name_"), "TFWithDrop must have attribute 'name_'"
         self.drop_menu = DropMenu(parent_=self)
 
-        self.items = None
-        self._update_items()
+        # имена берутся из общего для процесса кэша имен таблицы, при первом обращении он загружается
+        # в потоке DBWorker, затем обновляется после каждой записи в таблицу (см. name_index)
+        if self.data_table.lower() not in name_indexes:
+            MainApp.DB.run_async(name_index, self.data_table)
+
+        # меню обновляется после паузы в наборе текста, а не на каждое нажатие клавиши
+        self._drop_menu_trigger = Clock.create_trigger(self.update_drop_menu, self.drop_menu_delay)
+        # еще не выполненный поиск похожих имен для предыдущего текста
+        self._similar_lookup: Optional[Future] = None
 
-    def _update_items(self):
-        self.items = take_name_from_db(self.data_table)
+    # максимальное количество имен во всплывающем меню при вводе текста
+    max_drop_items = 10
+    # пауза в наборе текста, после которой обновляется всплывающее меню, сек.
+    drop_menu_delay = 0.15
 
     def add_item_in_text_input(self, text_item):
+        self._cancel_drop_menu_update()
         self.text = text_item
         self.drop_menu.dismiss()
         super(TFWithDrop, self).on_text_validate()
@@ -1026,11 +1784,19 @@ class TFWithDrop(TextField):
         # устанавливаем для всплывающего меню поле ввода, откуда его вызывали
         self.drop_menu.caller = self
 
-        # берем текст вызывающего поля ввода для определения строк в всплывающем меню
-        items = take_name_from_db(self.data_table)
-        self.drop_menu.set_items(self, [i[0] for i in items])
+        index = name_indexes.get(self.data_table.lower())
+        if index is not None:
+            self._show_focus_items(index)
+        else:
+            # кэш имен таблицы еще загружается
+            MainApp.DB.run_async(name_index, self.data_table, callback=self._show_focus_items)
 
-        if items:
+    def _show_focus_items(self, index: NameIndex):
+        """Заполняет всплывающее меню всеми именами таблицы и открывает его."""
+        names = index.names()
+        self.drop_menu.set_items(self, names)
+
+        if names:
             try:
                 Clock.schedule_once(self.open_drop_menu, 0.1)
             except WidgetException:
@@ -1044,27 +1810,62 @@ class TFWithDrop(TextField):
     def do_backspace(self, from_undo=False, mode='bkspc'):
         """Обновляет всплывающее меню при удалении текста."""
         super(TFWithDrop, self).do_backspace(from_undo=from_undo, mode=mode)
-        self.update_drop_menu()
+        self._schedule_drop_menu_update()
 
     def insert_text(self, substring, from_undo=False):
         """Обновляет всплывающее меню при вводе текста."""
         super(TFWithDrop, self).insert_text(substring, from_undo=from_undo)
-        self.update_drop_menu()
-
-    def update_drop_menu(self):
+        self._schedule_drop_menu_update()
+
+    def _schedule_drop_menu_update(self):
+        """Откладывает обновление меню на drop_menu_delay: каждое нажатие клавиши переносит его,
+        поэтому при быстром наборе меню перестраивается один раз - для последнего текста."""
+        self._drop_menu_trigger.cancel()
+        self._drop_menu_trigger()
+
+    def _cancel_drop_menu_update(self):
+        """Отменяет отложенное обновление меню и поиск похожих имен для устаревшего текста."""
+        self._drop_menu_trigger.cancel()
+        if self._similar_lookup is not None:
+            # уже начатый поиск не прерывается, его результат отбросит _show_similar_items
+            self._similar_lookup.cancel()
+            self._similar_lookup = None
+
+    def update_drop_menu(self, _=None):
         """Обновление items всплывающего меню, которые подходят по набранному тексту."""
-        matching_items = []
-
-        for item in self.items:
-            if self.text.lower() in item[0].lower():
-                matching_items.append(item)
+        self._cancel_drop_menu_update()
+        index = name_indexes.get(self.data_table.lower())
+        if index is None:
+            # кэш имен таблицы еще загружается, без него нельзя предлагать добавить имя
+            return
 
-        self.drop_menu.set_items(self, [i[0] for i in matching_items], added_item=self.text)
+        matching_items = index.search(self.text, self.max_drop_items)
+        self.drop_menu.set_items(self, matching_items, added_item=self.text)
         self.drop_menu.update()
 
+        if not matching_items and MainApp.DB.names_fts_available:
+            # имени нет в таблице - возможно, оно набрано с опечаткой: похожие имена ищутся в БД
+            self._similar_lookup = MainApp.DB.run_async(
+                MainApp.DB.search_names, self.data_table, self.text, self.max_drop_items,
+                callback=lambda names, text=self.text: self._show_similar_items(text, names))
+
+    def _show_similar_items(self, text: str, names: list):
+        """Показывает под предложением добавить text похожие имена из таблицы.
+        Результат поиска для уже измененного текста не показывается."""
+        self._similar_lookup = None
+        if names and text == self.text:
+            self.drop_menu.set_items(self, [], added_item=text, similar_items=names)
+            self.drop_menu.update()
+
     def on_text_validate(self):
         """При нажатии кнопки Enter вводит текст первого item в строку или открывает меню добавления, если item'ов
         нет."""
+        if self._drop_menu_trigger.is_triggered:
+            # меню еще не обновлено для последнего набранного текста
+            self.update_drop_menu()
+        if not self.drop_menu.items:
+            # кэш имен таблицы еще загружается - выбирать пока не из чего
+            return
         text_dropmenu = self.drop_menu.items[0]["text"]
         self.drop_menu.dismiss()
 
@@ -1073,7 +1874,6 @@ class TFWithDrop(TextField):
             self.text = ''
         else:
             self.text = text_dropmenu
-            self._update_items()
             super(TFWithDrop, self).on_text_validate()
 
 
@@ -1104,20 +1904,14 @@ class TFWithDrop(TextField):
         self.add_data_dialog.open()
 
     def return_data_(self):
-        # поле, имеющее всплывающее окно записываются в БД через id
-        # если полей заполнения несколько, разбивает строку по пробелу
-        all_conditions_values = self.text.split(' ') if len(self.what_fields_child_fill) > 1 else [self.text]
-        conditions_dict = {}
-
-        # составляет словарь, где ключ - поле в БД, по которому искать, значение - фильтрующее значение
-        for inx, condition in enumerate(all_conditions_values):
-            try:
-                conditions_dict[self.what_fields_child_fill[inx]] = condition
-            except IndexError:
-                continue
+        # поле, имеющее всплывающее окно записываются в БД через id.
+        # id находится по показываемому имени в общем кэше имен таблицы, без запроса к БД из главного потока
+        index = name_indexes.get(self.data_table.lower())
+        if index is None:
+            open_text_dialog(f"Names of the table {self.data_table.capitalize()} are still loading, try again")
+            return False
 
-        # запрашивает id исходя из условий
-        id_ = take_one_data("id", self.data_table, conditions_dict)
+        id_ = index.find_id(self.text.strip())
         if id_ is not None:
             return {self.data_key: id_}
         else:
@@ -1523,10 +2317,16 @@ class LabelWithChange(BoxLayout, TouchBehavior):
         if all([self.text_field.required, not self.text_field.text]):
             self.text_field.text = ""
         else:
-            MainApp.DB.update("Games", self.text_field.return_data(), {"id": self.game.id_in_db})
-            self.label_value.text = self.text_field.text
-            self.change_mode("view")
-            APP.app_screen.games_screen.table_games.update()
+            data = self.text_field.return_data()
+            if not data:
+                # имя не найдено в таблице (return_data уже сообщил об этом)
+                return
+            text = self.text_field.text
+            APP.app_screen.games_screen.update_game(self.game, data, callback=lambda: self._show_value(text))
+
+    def _show_value(self, text: str):
+        self.label_value.text = text
+        self.change_mode("view")
 
     def click_cancel(self, _=None):
         self.change_mode("view")
@@ -1602,7 +2402,7 @@ class PaymentLWC(LabelWithChange):
 
 
 class MainApp(MDApp):
-    DB = ConnDB()
+    DB = shared_db()
 
     def build(self):
         self.theme_cls.primary_palette = "Green"
@@ -1616,6 +2416,9 @@ class MainApp(MDApp):
 
         return self.app_screen
 
+    def on_stop(self):
+        self.DB.close_all()
+
 
 APP = MainApp()
 